@@ -1,94 +1,52 @@
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-from langchain_openai import ChatOpenAI  # pyright: ignore[reportMissingImports]
-from langchain_anthropic import ChatAnthropic # pyright: ignore[reportMissingImports]
-from langchain_core.prompts import ChatPromptTemplate # pyright: ignore[reportMissingImports]
-from langchain_core.output_parsers import PydanticOutputParser # pyright: ignore[reportMissingImports]
-from langchain.agents import create_tool_calling_agent, AgentExecutor # pyright: ignore[reportMissingImports]
 from typing import List, Optional, Dict
-from agents.scene_gen import SceneDescription
-from tools import manim_tool
-from scripts.manim_validator import validate_all_scenes, ValidationResult
+from agents.schemas import ScriptGeneration, SceneDescription, ManimObject, ManimAnimation, ManimScene, ManimFile
+from agents.llm import ModelSpec, stage_model
+from agents.runner import run_agent
+from scripts.code_formatter import format_manim_file
+from scripts.manim_validator import iter_validate_scenes, ValidationResult
 from scripts.error_parser import parse_manim_errors, ManimError
+from scripts.plan_checker import check_plan_conformance, ConformanceViolation
+from scripts.tracing import span
+from scripts.profiler import memory_section
+from scripts.rate_limiter import job_context, job_priority
+from scripts import progress
 
 load_dotenv()
 
-class ManimObject(BaseModel):
-    object_id: str = Field(description="matches ScenePlan.object_id")
-    var_name: str = Field(description="Python variable name")
-    constructor: str = Field(description="Manim constructor call")
-    add_to_scene: bool = Field(description="whether to immediately add to scene")
-
-class ManimAnimation(BaseModel):
-    animation_id: str = Field(description="matches Action.action_id")
-    call: str = Field(description="self.play(...) call")
-    run_time: Optional[float] = Field(default=None, description="explicit run_time if specified")
-
-class ManimScene(BaseModel):
-    scene_id: str = Field(description="matches ScenePlan.scene_id")
-    class_name: str = Field(description="Python class name for Manim scene")
-    setup_code: Optional[List[str]] = Field(default=None, description="initialization code before animations")
-    objects: List["ManimObject"]
-    animations: List["ManimAnimation"]
-
-class ManimFile(BaseModel):
-    imports: List[str] = Field(description="Manim and Python imports required")
-    scenes: List["ManimScene"]
-
-def generate_code(scene: SceneDescription, error_feedback: Optional[str] = None):
+def generate_code(
+    scene: SceneDescription,
+    error_feedback: Optional[str] = None,
+    model: Optional[ModelSpec] = None
+):
     """
     Generate Manim code from scene description.
 
     Args:
         scene: SceneDescription from scene_gen agent
         error_feedback: Optional error feedback from previous validation failure
+        model: Model to use (default: first rung of the code_gen ladder)
 
     Returns:
         ManimFile or Exception on parsing failure
     """
-    scene_json = scene.model_dump_json()
-    llm = ChatAnthropic(temperature=0.1, model="claude-3-7-sonnet-20250219")
-    parser = PydanticOutputParser(pydantic_object=ManimFile)
-    with open("prompts/code_gen.md", "r") as f:
-        system_prompt = f.read()
-
     # Build prompt with error feedback if provided
-    messages = [
-        ("system", system_prompt),
-        ("placeholder", "{chat_history}"),
-        ("human", "{scene_json}")
-    ]
+    human_messages = ["{scene_json}"]
+    invoke_input = {"scene_json": scene.model_dump_json()}
 
     # Add error feedback message if retrying
     if error_feedback:
-        messages.append(("human", "{error_feedback}"))
-
-    messages.append(("placeholder", "{agent_scratchpad}"))
-
-    prompt = ChatPromptTemplate.from_messages(messages).partial(
-        format_instructions=parser.get_format_instructions()
-    )
-
-    tools = [manim_tool]
-    agent = create_tool_calling_agent(
-        llm=llm,
-        prompt=prompt,
-        tools=tools
-    )
-    context_agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-
-    # Invoke with or without error feedback
-    invoke_input = {"scene_json": scene_json}
-    if error_feedback:
+        human_messages.append("{error_feedback}")
         invoke_input["error_feedback"] = error_feedback
 
-    raw_response = context_agent_executor.invoke(invoke_input)
-    try:
-        structured_response = parser.parse(raw_response.get("output"))
-        return structured_response
-    except Exception as e:
-        print(f"Error parsing response: {e}")
-        return e
+    return run_agent(
+        "code_gen",
+        prompt_path="prompts/code_gen.md",
+        human_messages=human_messages,
+        invoke_input=invoke_input,
+        schema=ManimFile,
+        model=model
+    )
 
 
 def _identify_root_causes(errors: List[ManimError]) -> str:
@@ -137,10 +95,46 @@ def _generate_action_items(errors: List[ManimError]) -> str:
     return "\n".join(actions) if actions else "  1. Review error and correct code"
 
 
+def format_scene_feedback(result: ValidationResult) -> str:
+    """
+    Format one failed scene's validation output for the code_gen agent.
+
+    Args:
+        result: Failed ValidationResult
+
+    Returns:
+        Feedback section for this scene
+    """
+    feedback = f"SCENE: {result.class_name} (scene_id: {result.scene_id})\n"
+    feedback += f"STATUS: Compilation error\n\n"
+    feedback += "━━━ MANIM ERROR OUTPUT ━━━\n"
+    feedback += result.stderr + "\n"
+    feedback += "━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    feedback += "FAILED CODE YOU GENERATED:\n```python\n"
+    feedback += result.code + "\n```\n\n"
+
+    # Parse errors
+    parsed_errors = parse_manim_errors(result.stderr)
+
+    if parsed_errors:
+        feedback += "ERROR ANALYSIS:\n"
+        for error in parsed_errors:
+            feedback += f"  Line {error.line_number}: {error.error_type} - {error.message}\n"
+
+        feedback += "\nROOT CAUSE:\n"
+        feedback += _identify_root_causes(parsed_errors) + "\n"
+
+        feedback += "\nREQUIRED ACTIONS:\n"
+        feedback += _generate_action_items(parsed_errors) + "\n\n"
+
+    return feedback
+
+
 def format_feedback_for_agent(
     validation_results: List[ValidationResult],
     attempt_num: int,
-    max_retries: int
+    max_retries: int,
+    scene_sections: Optional[List[str]] = None
 ) -> str:
     """
     Format validation errors as rich feedback for code_gen agent.
@@ -149,40 +143,42 @@ def format_feedback_for_agent(
         validation_results: List of validation results (may include failures)
         attempt_num: Current attempt number (1-indexed)
         max_retries: Maximum retries allowed
+        scene_sections: Per-scene sections already built with format_scene_feedback
+            (e.g. while other scenes were still validating); computed if omitted
 
     Returns:
         Formatted feedback string for agent
     """
     feedback = f"⚠️ VALIDATION FAILED - Attempt {attempt_num}/{max_retries}\n\n"
 
-    for result in validation_results:
-        if not result.success:
-            feedback += f"SCENE: {result.class_name} (scene_id: {result.scene_id})\n"
-            feedback += f"STATUS: Compilation error\n\n"
-            feedback += "━━━ MANIM ERROR OUTPUT ━━━\n"
-            feedback += result.stderr + "\n"
-            feedback += "━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-            feedback += "FAILED CODE YOU GENERATED:\n```python\n"
-            feedback += result.code + "\n```\n\n"
+    if scene_sections is None:
+        scene_sections = [format_scene_feedback(r) for r in validation_results if not r.success]
+    feedback += "".join(scene_sections)
 
-            # Parse errors
-            parsed_errors = parse_manim_errors(result.stderr)
+    feedback += "\nCRITICAL: Only use classes that manim_doc_reference confirms exist.\n"
+    feedback += "Do NOT assume any class exists without tool validation.\n"
+    feedback += "Regenerate the ManimFile with validated Manim APIs only."
 
-            if parsed_errors:
-                feedback += "ERROR ANALYSIS:\n"
-                for error in parsed_errors:
-                    feedback += f"  Line {error.line_number}: {error.error_type} - {error.message}\n"
+    return feedback
 
-                feedback += "\nROOT CAUSE:\n"
-                feedback += _identify_root_causes(parsed_errors) + "\n"
 
-                feedback += "\nREQUIRED ACTIONS:\n"
-                feedback += _generate_action_items(parsed_errors) + "\n\n"
+def format_conformance_feedback(violations: List[ConformanceViolation]) -> str:
+    """
+    Format plan-conformance violations as a feedback section for code_gen agent.
 
-    feedback += "\nCRITICAL: Only use classes that manim_doc_reference confirms exist.\n"
-    feedback += "Do NOT assume any class exists without tool validation.\n"
-    feedback += "Regenerate the ManimFile with validated Manim APIs only."
+    Args:
+        violations: Violations from check_plan_conformance
 
+    Returns:
+        Feedback section listing violations per scene
+    """
+    feedback = "━━━ PLAN CONFORMANCE ━━━\n"
+    for violation in violations:
+        label = "ERROR" if violation.severity == "error" else "WARNING"
+        feedback += f"  [{label}] {violation.scene_id}: {violation.kind} - {violation.message}\n"
+    feedback += "━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    feedback += "Every ScenePlan.scene_id, Action.action_id and Object.object_id must appear in the ManimFile "
+    feedback += "with matching ids, and variables must be defined before use.\n\n"
     return feedback
 
 
@@ -195,7 +191,8 @@ class ValidationFailedError(Exception):
 
 def generate_code_with_validation(
     scene: SceneDescription,
-    max_retries: int = 3
+    max_retries: int = 3,
+    script: Optional[ScriptGeneration] = None
 ) -> ManimFile:
     """
     Generate Manim code with validation feedback loop.
@@ -203,6 +200,7 @@ def generate_code_with_validation(
     Args:
         scene: SceneDescription from scene_gen agent
         max_retries: Maximum retry attempts (default 3)
+        script: ScriptGeneration the scenes came from, for beat-duration checks
 
     Returns:
         Validated ManimFile
@@ -211,50 +209,142 @@ def generate_code_with_validation(
         ValidationFailedError: If validation fails after max_retries
 
     Process:
-        1. Generate code with code_gen agent
-        2. Format and validate with manim --dry_run
-        3. If errors: parse, format feedback, retry
-        4. If success: return ManimFile
+        1. Generate code with code_gen agent, using the attempt's rung of the
+           code_gen model ladder (config/models.json)
+        2. Check ids/variables against the scene plan (no subprocess)
+        3. Format and validate with manim --dry_run
+        4. If errors: parse, format feedback, retry only the failed scenes
+           on the next rung
+        5. If success: return ManimFile with every validated scene
     """
-    # Lazy import to avoid circular dependency
-    from scripts.code_formatter import format_manim_file
-
     feedback = None
+    pending = scene  # Scenes still to generate; narrowed to failures after each attempt
+    accepted: Dict[str, ManimScene] = {}
+    imports: List[str] = []
 
     for attempt in range(1, max_retries + 1):
-        print(f"\n[Code Gen] Attempt {attempt}/{max_retries}...")
-
-        # Generate code (with feedback if retrying)
-        manim_file = generate_code(scene, error_feedback=feedback)
-
-        # Check if parsing failed
-        if isinstance(manim_file, Exception):
-            print(f"[Code Gen] Parsing failed: {manim_file}")
-            if attempt == max_retries:
-                raise ValidationFailedError(
-                    f"Code generation parsing failed after {max_retries} attempts",
-                    []
+        model = stage_model("code_gen", attempt)
+        with span(
+            "code_gen.attempt",
+            attempt=attempt,
+            model=model.label,
+            scenes=len(pending.scenes)
+        ) as attempt_span:
+            print(f"\n[Code Gen] Attempt {attempt}/{max_retries} ({model.label}, {len(pending.scenes)} scenes)...")
+
+            # Generate code (with feedback if retrying). Retries, and lessons with
+            # most scenes already validated, go ahead of fresh work for LLM capacity.
+            priority = job_priority() + (attempt - 1) + len(accepted) / max(len(scene.scenes), 1)
+            with job_context(priority=priority):
+                manim_file = generate_code(pending, error_feedback=feedback, model=model)
+
+            # Check if parsing failed
+            if isinstance(manim_file, Exception):
+                print(f"[Code Gen] Parsing failed: {manim_file}")
+                attempt_span.set("outcome", "parse_error")
+                attempt_span.set("error_types", [type(manim_file).__name__])
+                if attempt == max_retries:
+                    raise ValidationFailedError(
+                        f"Code generation parsing failed after {max_retries} attempts",
+                        []
+                    )
+                feedback = f"Previous attempt failed to generate valid JSON. Error: {manim_file}\nEnsure output matches ManimFile schema exactly."
+                continue
+
+            # Cheap structural check against the plan before any dry run
+            violations = check_plan_conformance(pending, manim_file, script)
+            plan_errors = [v for v in violations if v.severity == "error"]
+            if plan_errors:
+                print(f"[Code Gen] ✗ {len(plan_errors)} plan conformance errors")
+                progress.emit(
+                    "validation",
+                    attempt=attempt,
+                    check="plan",
+                    success=False,
+                    errors=[f"{v.scene_id}: {v.message}" for v in plan_errors]
+                )
+                attempt_span.set("outcome", "plan_mismatch")
+                attempt_span.set("error_types", sorted({v.kind for v in plan_errors}))
+                if attempt == max_retries:
+                    raise ValidationFailedError(
+                        f"Generated code did not conform to the scene plan after {max_retries} attempts",
+                        []
+                    )
+                feedback = f"⚠️ PLAN CONFORMANCE FAILED - Attempt {attempt}/{max_retries}\n\n"
+                feedback += format_conformance_feedback(violations)
+                feedback += "Regenerate the ManimFile covering the full scene plan."
+                continue
+
+            # Format to Python code
+            code_files = format_manim_file(manim_file)
+
+            # Validate all scenes, building feedback for each failure as it streams in
+            # rather than waiting for the slowest scene. Waiting on the dry runs and
+            # formatting feedback are profiled as separate memory sections.
+            print(f"[Code Gen] Validating {len(code_files)} scenes...")
+            validation_results = []
+            failed = []
+            scene_sections = []
+            results = iter_validate_scenes(code_files)
+            try:
+                while True:
+                    with memory_section("validate_all_scenes"):
+                        result = next(results, None)
+                    if result is None:
+                        break
+                    validation_results.append(result)
+                    if not result.success:
+                        failed.append(result)
+                        with memory_section("format_scene_feedback"):
+                            scene_sections.append(format_scene_feedback(result))
+                    progress.emit(
+                        "validation",
+                        attempt=attempt,
+                        check="dry_run",
+                        filename=result.filename,
+                        class_name=result.class_name,
+                        success=result.success,
+                        errors=[] if result.success else [
+                            f"{e.error_type}: {e.message}" for e in parse_manim_errors(result.stderr)
+                        ]
+                    )
+            finally:
+                # Shut the validator pool down now, not at garbage collection, if we leave early (e.g. JobCancelled)
+                results.close()
+
+            # Keep scenes that passed; only the failures go to the next rung
+            scenes_by_file = {f"{s.scene_id}.py": s for s in manim_file.scenes}
+            failed_files = {r.filename for r in failed}
+            for filename, manim_scene in scenes_by_file.items():
+                if filename not in failed_files:
+                    accepted[manim_scene.scene_id] = manim_scene
+                    progress.emit("scene", scene_id=manim_scene.scene_id, filename=filename, code=code_files.get(filename))
+            imports.extend(i for i in manim_file.imports if i not in imports)
+
+            if not failed:
+                attempt_span.set("outcome", "ok")
+                print(f"[Code Gen] ✓ All scenes validated successfully")
+                return ManimFile(
+                    imports=imports,
+                    scenes=[accepted[plan.scene_id] for plan in scene.scenes if plan.scene_id in accepted]
                 )
-            feedback = f"Previous attempt failed to generate valid JSON. Error: {manim_file}\nEnsure output matches ManimFile schema exactly."
-            continue
-
-        # Format to Python code
-        code_files = format_manim_file(manim_file)
-
-        # Validate all scenes
-        print(f"[Code Gen] Validating {len(code_files)} scenes...")
-        validation_results = validate_all_scenes(code_files)
-
-        # Check for failures
-        failed = [r for r in validation_results if not r.success]
-
-        if not failed:
-            print(f"[Code Gen] ✓ All scenes validated successfully")
-            return manim_file
 
-        # Format feedback for retry
-        print(f"[Code Gen] ✗ {len(failed)}/{len(validation_results)} scenes failed validation")
-        feedback = format_feedback_for_agent(failed, attempt, max_retries)
+            # Format feedback for retry
+            print(f"[Code Gen] ✗ {len(failed)}/{len(validation_results)} scenes failed validation")
+            attempt_span.set("outcome", "validation_failed")
+            attempt_span.set("failed_scenes", len(failed))
+            attempt_span.set("error_types", sorted({
+                e.error_type for r in failed for e in parse_manim_errors(r.stderr)
+            }))
+            with memory_section("format_feedback_for_agent"):
+                feedback = format_feedback_for_agent(failed, attempt, max_retries, scene_sections)
+            if violations:
+                # Only warnings remain (e.g. timing drift); pass them along with the errors
+                feedback += "\n\n" + format_conformance_feedback(violations)
+
+            failed_ids = {scenes_by_file[f].scene_id for f in failed_files if f in scenes_by_file}
+            if failed_ids:
+                pending = SceneDescription(scenes=[p for p in pending.scenes if p.scene_id in failed_ids])
 
     # Max retries exceeded
     raise ValidationFailedError(
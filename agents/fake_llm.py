@@ -0,0 +1,133 @@
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+from pydantic import PrivateAttr
+
+from langchain_core.language_models.chat_models import BaseChatModel # pyright: ignore[reportMissingImports]
+from langchain_core.messages import AIMessage # pyright: ignore[reportMissingImports]
+from langchain_core.outputs import ChatGeneration, ChatResult # pyright: ignore[reportMissingImports]
+
+
+class FakeProviderError(Exception):
+    """Injected provider failure carrying an HTTP status, like the SDKs' APIStatusError"""
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+        super().__init__(f"Fake provider returned HTTP {status_code}")
+
+
+def sample_latency(spec: Optional[Dict[str, Any]], rng: random.Random) -> float:
+    """
+    Draw a latency in seconds from a distribution spec.
+
+    Supported specs:
+        {"distribution": "fixed", "seconds": 1.0}
+        {"distribution": "uniform", "low": 0.5, "high": 2.0}
+        {"distribution": "lognormal", "median": 1.0, "sigma": 0.5}
+        {"distribution": "exponential", "mean": 1.0}
+        {"distribution": "bimodal", "fast": {...}, "slow": {...}, "slow_probability": 0.05}
+    """
+    if not spec:
+        return 0.0
+    distribution = spec.get("distribution", "fixed")
+    if distribution == "fixed":
+        return spec.get("seconds", 0.0)
+    if distribution == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if distribution == "lognormal":
+        return rng.lognormvariate(math.log(spec["median"]), spec.get("sigma", 0.5))
+    if distribution == "exponential":
+        return rng.expovariate(1.0 / spec["mean"])
+    if distribution == "bimodal":
+        branch = "slow" if rng.random() < spec.get("slow_probability", 0.05) else "fast"
+        return sample_latency(spec[branch], rng)
+    raise ValueError(f"Unknown latency distribution '{distribution}'")
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model returning canned responses with injected latency and errors.
+
+    Built by build_chat_model("fake", ...) from the rung's options, e.g.
+        {"provider": "fake", "model": "slow-sonnet", "options": {
+            "responses_file": "fixtures/code_gen.json",
+            "latency": {"distribution": "lognormal", "median": 2.0, "sigma": 1.0},
+            "error_rate": 0.05, "error_status": 429, "retry_after": 2, "seed": 7}}
+
+    config/models.fake.json runs the whole pipeline offline against the canned
+    lesson in fixtures/ (THEOREM_MODEL_CONFIG=config/models.fake.json).
+
+    Responses cycle in order; each is a string or a JSON value (dumped to a string).
+    A system message seen before is reported as cached input tokens, like a
+    provider prompt cache.
+    """
+    model: str = "fake"
+    responses: List[Any] = ["{}"]
+    latency: Optional[Dict[str, Any]] = None
+    error_rate: float = 0.0
+    error_status: int = 429
+    retry_after: Optional[float] = None
+    seed: Optional[int] = None
+
+    _index: int = PrivateAttr(default=0)
+    _rng: Optional[random.Random] = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _cached_prefixes: Set[str] = PrivateAttr(default_factory=set)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(**kwargs)
+
+    def _cached_tokens(self, messages) -> int:
+        """Tokens of the system prefix if an identical one was sent before"""
+        if not messages or messages[0].type != "system":
+            return 0
+        prefix = json.dumps(messages[0].content, sort_keys=True)
+        with self._lock:
+            hit = prefix in self._cached_prefixes
+            self._cached_prefixes.add(prefix)
+        return len(str(messages[0].content)) // 4 if hit else 0
+
+    def _next(self):
+        with self._lock:
+            if self._rng is None:
+                self._rng = random.Random(self.seed)
+            response = self.responses[self._index % len(self.responses)]
+            self._index += 1
+            delay = sample_latency(self.latency, self._rng)
+            fail = self._rng.random() < self.error_rate
+        return response, delay, fail
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        response, delay, fail = self._next()
+        time.sleep(delay)
+        if fail:
+            raise FakeProviderError(self.error_status, self.retry_after)
+        content = response if isinstance(response, str) else json.dumps(response)
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        message = AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_chars // 4,
+                "output_tokens": len(content) // 4,
+                "total_tokens": (prompt_chars + len(content)) // 4,
+                "input_token_details": {"cache_read": self._cached_tokens(messages)},
+            },
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def build_fake_chat_model(model: str, options: Dict[str, Any]) -> FakeChatModel:
+    """Construct a FakeChatModel from a model-config rung's options"""
+    options = dict(options)
+    responses_file = options.pop("responses_file", None)
+    if responses_file:
+        with open(responses_file, "r") as f:
+            options["responses"] = json.load(f)
+    return FakeChatModel(model=model, **options)
@@ -0,0 +1,149 @@
+import json
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from scripts.rate_limiter import current_job_id
+
+# Provider SDKs (langchain_openai, langchain_anthropic) take seconds to import,
+# so they are only imported when a model is actually built.
+
+DEFAULT_MODEL_CONFIG_PATH = "config/models.json"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """One rung of a stage's model ladder"""
+    provider: str
+    model: str
+    temperature: Optional[float] = None
+    options: Dict[str, Any] = field(default_factory=dict, compare=False)  # extra provider settings
+
+    @property
+    def label(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+# (job id, model/options key) -> FakeChatModel
+_fake_models: Dict[Tuple[str, str], Any] = {}
+
+
+def release_fake_models(job_id: str):
+    """Drop the fake models built for job_id once it has finished"""
+    for key in [key for key in _fake_models if key[0] == job_id]:
+        _fake_models.pop(key, None)
+
+
+def build_chat_model(
+    provider: str,
+    model: str,
+    temperature: Optional[float] = None,
+    options: Optional[Dict[str, Any]] = None
+):
+    """
+    Construct a LangChain chat model, importing the provider SDK on first use.
+
+    Args:
+        provider: "openai", "anthropic" or "fake" (offline, see agents/fake_llm.py)
+        model: Provider model name (e.g. "gpt-4o-mini")
+        temperature: Sampling temperature, or None for the provider default
+        options: Extra settings from the model config (fake models only)
+
+    Returns:
+        ChatOpenAI, ChatAnthropic or FakeChatModel instance
+    """
+    if provider == "fake":
+        # One instance per configured fake and job, so canned responses keep cycling
+        # across a job's calls without concurrent jobs taking each other's turns
+        key = (current_job_id(), json.dumps([model, options or {}], sort_keys=True))
+        if key not in _fake_models:
+            from agents.fake_llm import build_fake_chat_model
+            _fake_models[key] = build_fake_chat_model(model, options or {})
+        return _fake_models[key]
+
+    kwargs = {"model": model}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI  # pyright: ignore[reportMissingImports]
+        return ChatOpenAI(**kwargs)
+    if provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic # pyright: ignore[reportMissingImports]
+        return ChatAnthropic(**kwargs)
+    raise ValueError(f"Unknown LLM provider '{provider}'")
+
+
+@dataclass
+class ModelConfig:
+    """Parsed config/models.json"""
+    stages: Dict[str, List[ModelSpec]]
+    fallbacks: Dict[str, List[ModelSpec]]
+    hedging: Dict[str, Any]
+    rate_limits: Dict[str, Dict[str, float]]
+
+
+@lru_cache(maxsize=None)
+def load_model_config(path: Optional[str] = None) -> ModelConfig:
+    """
+    Load per-stage model ladders, fallback models, hedging settings and rate limits.
+
+    "stages" maps stage name → list of {"provider", "model", "temperature", "options"}
+    rungs, cheapest first. "fallbacks" maps stage name → models raced against the
+    primary when it is slow or fails with 429/5xx. "rate_limits" maps "provider"
+    or "provider/model" → {"rpm", "tpm"}. Path defaults to THEOREM_MODEL_CONFIG,
+    then config/models.json.
+    """
+    path = path or os.getenv("THEOREM_MODEL_CONFIG", DEFAULT_MODEL_CONFIG_PATH)
+    with open(path, "r") as f:
+        raw = json.load(f)
+
+    stages = {}
+    for stage, rungs in raw["stages"].items():
+        if not rungs:
+            raise ValueError(f"Model config for stage '{stage}' has no rungs")
+        stages[stage] = [ModelSpec(**rung) for rung in rungs]
+    fallbacks = {
+        stage: [ModelSpec(**rung) for rung in rungs]
+        for stage, rungs in raw.get("fallbacks", {}).items()
+    }
+    return ModelConfig(
+        stages=stages,
+        fallbacks=fallbacks,
+        hedging=raw.get("hedging", {}),
+        rate_limits=raw.get("rate_limits", {})
+    )
+
+
+def stage_ladder(stage: str) -> List[ModelSpec]:
+    """Escalation ladder for a stage, cheapest rung first"""
+    config = load_model_config()
+    if stage not in config.stages:
+        raise KeyError(f"No model configured for stage '{stage}'")
+    return config.stages[stage]
+
+
+def stage_fallbacks(stage: str) -> List[ModelSpec]:
+    """Models to hedge with or fall back to for a stage, in preference order"""
+    return load_model_config().fallbacks.get(stage, [])
+
+
+def hedging_settings() -> Dict[str, Any]:
+    """
+    Hedge deadline settings: "percentile" of observed latency (default 0.95),
+    "min_samples" before the percentile is trusted (default 5),
+    "default_deadline_seconds" until then and "min_deadline_seconds" floor.
+    A null default deadline disables hedging until enough samples exist.
+    """
+    return load_model_config().hedging
+
+
+def rate_limits() -> Dict[str, Dict[str, float]]:
+    """Requests/tokens per minute for each "provider" or "provider/model" bucket"""
+    return load_model_config().rate_limits
+
+
+def stage_model(stage: str, attempt: int = 1) -> ModelSpec:
+    """Model for a stage's Nth attempt (1-indexed); stays on the top rung once reached"""
+    ladder = stage_ladder(stage)
+    return ladder[min(attempt, len(ladder)) - 1]
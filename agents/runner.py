@@ -0,0 +1,252 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Type
+from pydantic import BaseModel
+from agents.llm import ModelSpec, build_chat_model, hedging_settings, rate_limits, stage_fallbacks, stage_model
+from scripts.cassette import active_cassette, recordable_chat_model
+from scripts.hedging import HedgeCancelled, error_status, hedged_call, latencies
+from scripts.rate_limiter import (
+    DEFAULT_RETRY_AFTER_SECONDS, PROVIDER_WIDE_STATUSES, estimate_tokens, retry_after_seconds, shared_limiter
+)
+from scripts.tracing import Span, span, token_usage, tracing_callbacks
+from scripts.profiler import memory_section, profile_thread
+from scripts.progress import JobCancelled, check_cancelled, is_cancelled
+
+
+# Providers whose prompt cache must be requested with cache_control breakpoints.
+# OpenAI caches any repeated prefix of 1024+ tokens automatically, so there the
+# static blocks only need to come first and stay byte-identical.
+EXPLICIT_CACHE_PROVIDERS = {"anthropic"}
+
+
+def _system_blocks(system_prompt: str, provider: str) -> List[dict]:
+    """
+    Static system prompt and format instructions as the cacheable prompt prefix.
+
+    Everything up to the last block (tool definitions, then the system blocks)
+    is cached; per-request content (scene JSON, error feedback, scratchpad)
+    follows in later messages, so retries reuse the cached prefix.
+    """
+    blocks = [
+        {"type": "text", "text": system_prompt},
+        {"type": "text", "text": "{format_instructions}"},
+    ]
+    if provider in EXPLICIT_CACHE_PROVIDERS:
+        blocks[-1]["cache_control"] = {"type": "ephemeral"}
+    return blocks
+
+
+def _hedge_deadline(stage: str, spec: ModelSpec) -> Optional[float]:
+    """Seconds to wait for spec before racing a fallback (percentile of past latency)"""
+    settings = hedging_settings()
+    observed = latencies.percentile(
+        f"{stage}/{spec.label}",
+        settings.get("percentile", 0.95),
+        settings.get("min_samples", 5)
+    )
+    if observed is None:
+        return settings.get("default_deadline_seconds")
+    return max(observed, settings.get("min_deadline_seconds", 0))
+
+
+def _cancel_callbacks(cancel: threading.Event) -> list:
+    """Callback that aborts a losing (or cancelled job's) AgentExecutor run at its next LLM or tool call"""
+    from langchain_core.callbacks import BaseCallbackHandler # pyright: ignore[reportMissingImports]
+
+    class CancelHandler(BaseCallbackHandler):
+        raise_error = True
+
+        def _check(self, *args, **kwargs):
+            if cancel.is_set():
+                raise HedgeCancelled()
+            check_cancelled()
+
+        on_chat_model_start = _check
+        on_llm_start = _check
+        on_tool_start = _check
+
+    return [CancelHandler()]
+
+
+def _rate_limit_callbacks(spec: ModelSpec, request_span: Span, cancel: threading.Event) -> list:
+    """
+    Callback that waits for rate-limit capacity before each LLM call.
+
+    Capacity is shared by every job in this process, and by every worker
+    process when THEOREM_RATE_LIMIT_DB names a SQLite file. A 429 blocks the
+    model for its Retry-After; an overloaded 503/529 blocks the whole provider.
+    """
+    cassette = active_cassette()
+    if cassette is not None and cassette.mode == "replay":
+        return []  # Replayed calls never reach a provider
+
+    from langchain_core.callbacks import BaseCallbackHandler # pyright: ignore[reportMissingImports]
+    limiter = shared_limiter(rate_limits(), os.getenv("THEOREM_RATE_LIMIT_DB"))
+
+    class RateLimitHandler(BaseCallbackHandler):
+        def __init__(self):
+            self.estimates: Dict[object, int] = {}
+
+        def _acquire(self, run_id, estimate: int):
+            self.estimates[run_id] = estimate
+            # Stop queueing once this request lost its hedge race or the job was cancelled
+            waited = limiter.acquire(
+                spec.provider, spec.model, estimate, lambda: cancel.is_set() or is_cancelled()
+            )
+            if waited >= 0.01:
+                request_span.add("rate_limit_wait_seconds", round(waited, 3))
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self._acquire(run_id, estimate_tokens(messages[0] if messages else []))
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self._acquire(run_id, estimate_tokens(prompts))
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            estimate = self.estimates.pop(run_id, 0)
+            usage = token_usage(response)
+            actual = usage["input_tokens"] + usage["output_tokens"]
+            if actual:
+                limiter.settle(spec.provider, spec.model, actual - estimate)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            self.estimates.pop(run_id, None)
+            seconds = retry_after_seconds(error)
+            status = error_status(error)
+            if seconds is None and status == 429:
+                seconds = DEFAULT_RETRY_AFTER_SECONDS
+            if seconds:
+                limiter.block(spec.provider, spec.model, seconds, provider_wide=status in PROVIDER_WIDE_STATUSES)
+                request_span.set("retry_after_seconds", seconds)
+
+    return [RateLimitHandler()]
+
+
+def _invoke_agent(
+    stage: str,
+    spec: ModelSpec,
+    prompt,
+    tools: list,
+    parser,
+    invoke_input: Dict[str, str],
+    stage_span: Span,
+    cancel: threading.Event
+):
+    """One AgentExecutor run against spec; returns the parsed schema or the parse Exception"""
+    from langchain.agents import create_tool_calling_agent, AgentExecutor # pyright: ignore[reportMissingImports]
+
+    with profile_thread(), span(f"agent.{stage}.request", model=spec.label) as request_span:
+        llm = recordable_chat_model(
+            f"{stage}/{spec.label}",
+            lambda: build_chat_model(spec.provider, spec.model, spec.temperature, spec.options)
+        )
+        agent = create_tool_calling_agent(
+            llm=llm,
+            prompt=prompt,
+            tools=tools
+        )
+        context_agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+        start = time.perf_counter()
+        raw_response = context_agent_executor.invoke(
+            invoke_input,
+            config={"callbacks": (
+                tracing_callbacks(request_span, rollup=stage_span)
+                + _rate_limit_callbacks(spec, request_span, cancel)
+                + _cancel_callbacks(cancel)
+            )}
+        )
+        latencies.observe(f"{stage}/{spec.label}", time.perf_counter() - start)
+        if cancel.is_set():
+            raise HedgeCancelled()
+
+        try:
+            with memory_section("output_parsing"):
+                structured_response = parser.parse(raw_response.get("output"))
+            return structured_response
+        except Exception as e:
+            request_span.set("parse_error", type(e).__name__)
+            print(f"Error parsing response: {e}")
+            return e
+
+
+def run_agent(
+    stage: str,
+    prompt_path: str,
+    human_messages: List[str],
+    invoke_input: Dict[str, str],
+    schema: Type[BaseModel],
+    use_tools: bool = True,
+    model: Optional[ModelSpec] = None
+):
+    """
+    Run a tool-calling agent stage and parse its output into schema.
+
+    The request goes to model (default: the stage's first rung). If it is
+    slower than the stage's hedge deadline, or fails with a 429/5xx, the same
+    request is raced against the stage's fallback models; the first response
+    that parses wins and the others are cancelled. The system prompt and
+    format instructions form a static prefix served from the provider's
+    prompt cache on repeat calls (see _system_blocks).
+
+    Args:
+        stage: Stage name in config/models.json (e.g. "code_gen")
+        prompt_path: System prompt file
+        human_messages: Human message templates, filled from invoke_input
+        invoke_input: Template variables for the human messages
+        schema: Pydantic model the output must parse into
+        use_tools: Give the agent the manim_doc_reference tool
+        model: Primary model, overriding the stage's first rung
+
+    Returns:
+        Parsed schema instance, or the Exception raised by parsing
+    """
+    # LangChain is imported here rather than at module level to keep startup fast.
+    # AgentExecutor is imported up front too, so first-use import time isn't
+    # counted against the primary request's hedge deadline.
+    from langchain_core.prompts import ChatPromptTemplate # pyright: ignore[reportMissingImports]
+    from langchain_core.output_parsers import PydanticOutputParser # pyright: ignore[reportMissingImports]
+    from langchain.agents import AgentExecutor # pyright: ignore[reportMissingImports] # noqa: F401
+
+    tools = []
+    if use_tools:
+        from tools import manim_tool
+        tools = [manim_tool]
+
+    parser = PydanticOutputParser(pydantic_object=schema)
+    with open(prompt_path, "r") as f:
+        system_prompt = f.read()
+
+    primary = model or stage_model(stage)
+    specs = [primary] + [spec for spec in stage_fallbacks(stage) if spec != primary]
+
+    prompts = {}
+    for provider in {spec.provider for spec in specs}:
+        messages = [
+            ("system", _system_blocks(system_prompt, provider)),
+            ("placeholder", "{chat_history}")
+        ]
+        messages.extend(("human", message) for message in human_messages)
+        messages.append(("placeholder", "{agent_scratchpad}"))
+        prompts[provider] = ChatPromptTemplate.from_messages(messages).partial(
+            format_instructions=parser.get_format_instructions()
+        )
+
+    with span(f"agent.{stage}", stage=stage, model=primary.label) as stage_span:
+        def on_launch(index: int, reason: str):
+            if index:
+                print(f"[{stage}] Racing {specs[index].label} ({reason})")
+                stage_span.add("hedged_requests")
+                stage_span.set(f"hedge.{index}", f"{specs[index].label}:{reason}")
+
+        legs = [
+            lambda cancel, spec=spec: _invoke_agent(
+                stage, spec, prompts[spec.provider], tools, parser, invoke_input, stage_span, cancel
+            )
+            for spec in specs
+        ]
+        result = hedged_call(legs, _hedge_deadline(stage, primary), on_launch=on_launch, abort_on=(JobCancelled,))
+        if isinstance(result, Exception):
+            stage_span.set("parse_error", type(result).__name__)
+        return result
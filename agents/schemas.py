@@ -0,0 +1,77 @@
+# Pydantic schemas shared by the agents, formatter and validators.
+# Keep this module free of LangChain/provider imports so tools that only read or
+# format artifacts start quickly.
+from pydantic import BaseModel, Field
+from typing import Any, List, Optional
+
+class SyncCue(BaseModel):
+    cue_text_fragment: str = Field(description="exact substring from narration_text for sync anchoring")
+    cue_intent: str = Field(description="high-level intent such as 'pause', 'transition', 'emphasize', etc.")
+
+class Beat(BaseModel):
+    beat_id: str = Field(description="identifier for usage across visuals. audio, and stitching")
+    narration_text: str = Field(description="spoken narration for this beat")
+    duration: float = Field(description="duration for visuals and narration")
+    concept_goal: str = Field(description="idea that the user must understand after this beat")
+    continuity: bool = Field(description="whether this beat starts from a fresh visual state or continues from the prior state. True = continues previous state, False = fresh visual state")
+    sync_cues: Optional[List[SyncCue]] = None
+
+class TimingModel(BaseModel):
+    basis: str = Field(description="how timing was estimated")
+    flexibility: str = Field(description="allowed deviation from estimated timing")
+
+class ScriptGeneration(BaseModel):
+    metadata: dict = Field(description="inferred assumptions like audience, scope, exclusions")
+    beats: List[Beat]
+    timing_model: TimingModel
+
+class Constraint(BaseModel):
+    name: str = Field(description="semantic constraint, such as 'right_angle', 'orthogonal', 'colinear'")
+    value: Any = Field(description="constraint value/parameter, such as true, 90, 'origin'")
+
+class Object(BaseModel):
+    object_id: str = Field(description="identifier for referencing across beats")
+    type: str = Field("conceptual type, such as triangle, vector, point, curve")
+    constraints: Optional[List[Constraint]] = Field(default=None, description="geometric or relational constraints")
+    labels: Optional[List[str]] = Field(default=None, description="optional labels visible on screen")
+
+class Action(BaseModel):
+    action_id: str = Field(description="identifier for this action")
+    action_type: str = Field(description="action type, such as create, transform, highlight, remove, etc.")
+    targets: List[str] = Field(description="object_id(s) this action applies to")
+    description: str = Field(description="high-level description of what happens visually")
+    sync_cue_id: Optional[str] = Field(default=None, description="optional reference to a sync cue from the beat")
+    duration: Optional[float] = Field(default=None, description="approximate time this action occupies within the beat")
+
+class ScenePlan(BaseModel):
+    scene_id: str = Field(description="identifier for this scene")
+    beat_id: str = Field(description="beat identifier, must match the originating beat")
+    continuity: bool = Field(description="true if visual state continues from previous scene")
+    objects: List[Object] = Field(description="objects that exist or are introduced in this scene")
+    actions: List[Action] = Field(description="ordered list of visual actions")
+    end_state_summary: str = Field(description="human-readable summary of final visual state")
+
+class SceneDescription(BaseModel):
+    scenes: List[ScenePlan]
+
+class ManimObject(BaseModel):
+    object_id: str = Field(description="matches ScenePlan.object_id")
+    var_name: str = Field(description="Python variable name")
+    constructor: str = Field(description="Manim constructor call")
+    add_to_scene: bool = Field(description="whether to immediately add to scene")
+
+class ManimAnimation(BaseModel):
+    animation_id: str = Field(description="matches Action.action_id")
+    call: str = Field(description="self.play(...) call")
+    run_time: Optional[float] = Field(default=None, description="explicit run_time if specified")
+
+class ManimScene(BaseModel):
+    scene_id: str = Field(description="matches ScenePlan.scene_id")
+    class_name: str = Field(description="Python class name for Manim scene")
+    setup_code: Optional[List[str]] = Field(default=None, description="initialization code before animations")
+    objects: List["ManimObject"]
+    animations: List["ManimAnimation"]
+
+class ManimFile(BaseModel):
+    imports: List[str] = Field(description="Manim and Python imports required")
+    scenes: List["ManimScene"]
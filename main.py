@@ -1,10 +1,16 @@
+import argparse
+import uuid
 from dotenv import load_dotenv
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Optional
 from agents.script_gen import generate_script
 from agents.scene_gen import generate_scene
 from agents.code_gen import generate_code_with_validation, ValidationFailedError
 from scripts.code_formatter import format_manim_file
+from scripts.tracing import span
+from scripts.profiler import PipelineProfiler, activate, profile_stage
+from scripts.rate_limiter import job_context
+from scripts import progress
 
 load_dotenv()
 
@@ -19,7 +25,7 @@ def write_scenes_to_files(code_files: Dict[str, str], output_dir: str = "manim_s
     """
     # Create output directory if it doesn't exist
     output_path = Path(output_dir)
-    output_path.mkdir(exist_ok=True)
+    output_path.mkdir(parents=True, exist_ok=True)
     
     written_files = []
     
@@ -29,32 +35,90 @@ def write_scenes_to_files(code_files: Dict[str, str], output_dir: str = "manim_s
         try:
             with open(file_path, 'w') as f:
                 f.write(code)
-            written_files.append(file_path)
-            print(f"✓ Written: {file_path}")
-        except Exception as e:
+        except OSError as e:
             print(f"✗ Failed to write {file_path}: {e}")
+            continue
+        written_files.append(file_path)
+        print(f"✓ Written: {file_path}")
+        progress.emit("artifact", filename=filename, path=str(file_path))
     
     print(f"\n✓ Generated {len(written_files)} scene files in {output_path}/")
     return written_files
 
 
-def main():
-    query = input("What can I help you learn? ")
-    try:
+def run_pipeline(
+    query: str,
+    max_retries: int = 3,
+    output_dir: str = "manim_scenes",
+    job_id: Optional[str] = None
+):
+    """
+    Run every stage for one query and write the validated scenes.
+
+    Each stage is recorded as a span (see scripts/tracing.py) and reported
+    as progress events (see scripts/progress.py). LLM calls are rate limited
+    as job_id (default: a fresh id), with later stages, and so nearly
+    finished lessons, scheduled ahead of earlier ones.
+
+    Raises:
+        ValidationFailedError: If code generation fails after max_retries
+    """
+    job_id = job_id or uuid.uuid4().hex[:12]
+    with span("pipeline", query=query, job_id=job_id), job_context(job_id=job_id):
         # Generate structured outputs
         print("\n[1/4] Generating script...")
-        script = generate_script(query)
+        with span("stage.script"), profile_stage("script"), progress.stage("script"), job_context(priority=0):
+            script = generate_script(query)
 
         print("[2/4] Generating scene descriptions...")
-        scene = generate_scene(script)
+        with span("stage.scene"), profile_stage("scene"), progress.stage("scene"), job_context(priority=1):
+            scene = generate_scene(script)
 
         print("[3/4] Generating Manim code with validation...")
-        manim_file = generate_code_with_validation(scene, max_retries=3)
+        with span("stage.code", max_retries=max_retries), profile_stage("code"), progress.stage("code"), \
+                job_context(priority=2):
+            manim_file = generate_code_with_validation(scene, max_retries=max_retries, script=script)
 
         # Convert to Python code and write to files
         print("[4/4] Writing scene files...")
-        code_files = format_manim_file(manim_file)
-        write_scenes_to_files(code_files)
+        with span("stage.write"), profile_stage("write"), progress.stage("write"):
+            code_files = format_manim_file(manim_file)
+            return write_scenes_to_files(code_files, output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Manim lessons from a question")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile",
+        metavar="DIR",
+        help="profile each stage and write a CPU/memory report to DIR (default: profile/)"
+    )
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        const=8000,
+        type=int,
+        metavar="PORT",
+        help="run the local HTTP job service instead of prompting (default port: 8000; see service.py)"
+    )
+    parser.add_argument("--workers", type=int, help="concurrent jobs in service mode (default: 2)")
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        from service import serve
+        serve(port=args.serve, workers=args.workers)
+        return
+
+    query = input("What can I help you learn? ")
+    profiler = PipelineProfiler(args.profile) if args.profile else None
+    try:
+        if profiler:
+            with activate(profiler):
+                run_pipeline(query, max_retries=3)
+        else:
+            run_pipeline(query, max_retries=3)
 
     except ValidationFailedError as e:
         print(f"\n✗ Code generation failed after {3} attempts")
@@ -66,6 +130,10 @@ def main():
     except Exception as e:
         print(f"Error: {e}")
 
+    finally:
+        if profiler:
+            print(f"\n✓ Profile report written to {profiler.write_report()}")
+
 
 if __name__ == "__main__":
     main()
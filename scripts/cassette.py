@@ -0,0 +1,262 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel # pyright: ignore[reportMissingImports]
+
+MODES = ("off", "record", "replay")
+SPEEDS = ("recorded", "instant")
+
+
+class CassetteMissError(Exception):
+    """Raised in replay mode when no recorded interaction matches a request"""
+    def __init__(self, kind: str, name: str, key: str):
+        self.kind = kind
+        self.name = name
+        self.key = key
+        super().__init__(f"No recorded {kind} interaction for '{name}' (key {key[:12]})")
+
+
+class ReplayedProviderError(Exception):
+    """A provider error captured while recording, raised again on replay"""
+    def __init__(self, error_type: str, message: str, status_code: Optional[int] = None):
+        self.error_type = error_type
+        self.status_code = status_code
+        super().__init__(f"{error_type}: {message}")
+
+
+def _request_key(kind: str, name: str, request: Any) -> str:
+    """Stable hash of a request, independent of dict ordering"""
+    payload = json.dumps([kind, name, request], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    JSON-lines file of recorded LLM and tool interactions.
+
+    Each line holds one interaction: kind ("chat" or "tool"), name, request key,
+    request, response and elapsed wall time. In replay mode identical requests
+    are served back in the order they were recorded.
+    """
+
+    def __init__(self, path: str, mode: str = "record", speed: str = "instant"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}', expected one of {MODES}")
+        if speed not in SPEEDS:
+            raise ValueError(f"Unknown replay speed '{speed}', expected one of {SPEEDS}")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._recorded: Dict[str, deque] = defaultdict(deque)
+
+        if mode == "replay":
+            self._load()
+        elif mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text("")
+
+    def _load(self):
+        with open(self.path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._recorded[entry["key"]].append(entry)
+
+    def record(self, kind: str, name: str, request: Any, response: Any, elapsed: float):
+        entry = {
+            "kind": kind,
+            "name": name,
+            "key": _request_key(kind, name, request),
+            "request": request,
+            "response": response,
+            "elapsed": elapsed,
+        }
+        line = json.dumps(entry, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+    def replay(self, kind: str, name: str, request: Any) -> Any:
+        key = _request_key(kind, name, request)
+        with self._lock:
+            entries = self._recorded.get(key)
+            if not entries:
+                raise CassetteMissError(kind, name, key)
+            entry = entries.popleft()
+        if self.speed == "recorded":
+            time.sleep(entry["elapsed"])
+        return entry["response"]
+
+
+_active: Optional[Cassette] = None
+_env_loaded = False
+
+
+def active_cassette() -> Optional[Cassette]:
+    """
+    Return the cassette in use, if any.
+
+    Configured programmatically with use_cassette() or through the
+    THEOREM_CASSETTE, THEOREM_CASSETTE_MODE and THEOREM_REPLAY_SPEED env vars.
+    """
+    global _active, _env_loaded
+    if _active is None and not _env_loaded:
+        _env_loaded = True
+        path = os.getenv("THEOREM_CASSETTE")
+        mode = os.getenv("THEOREM_CASSETTE_MODE", "off")
+        if path and mode != "off":
+            _active = Cassette(path, mode, os.getenv("THEOREM_REPLAY_SPEED", "instant"))
+    if _active is not None and _active.mode == "off":
+        return None
+    return _active
+
+
+@contextmanager
+def use_cassette(path: str, mode: str = "replay", speed: str = "instant"):
+    """Record or replay every wrapped chat model and tool call inside the block"""
+    global _active
+    previous = _active
+    _active = Cassette(path, mode, speed)
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@lru_cache(maxsize=None)
+def _recording_chat_model_class():
+    # Defined on first use so importing this module doesn't pull in LangChain
+    from langchain_core.language_models.chat_models import BaseChatModel # pyright: ignore[reportMissingImports]
+    from langchain_core.messages import message_to_dict, messages_from_dict, messages_to_dict # pyright: ignore[reportMissingImports]
+    from langchain_core.outputs import ChatGeneration, ChatResult # pyright: ignore[reportMissingImports]
+    from langchain_core.utils.function_calling import convert_to_openai_tool # pyright: ignore[reportMissingImports]
+
+    class RecordingChatModel(BaseChatModel):
+        """
+        Chat model wrapper that records to or replays from the active cassette.
+
+        The real model is only built (via factory) when a call is recorded, so
+        replay runs need neither provider SDK credentials nor network access.
+        """
+        name: str
+        factory: Callable[[], BaseChatModel]
+        cassette: Cassette
+        inner: Optional[BaseChatModel] = None
+
+        model_config = {"arbitrary_types_allowed": True}
+
+        @property
+        def _llm_type(self) -> str:
+            return f"recording-{self.name}"
+
+        def bind_tools(self, tools, **kwargs):
+            # Normalise to OpenAI tool dicts so the request key is provider-independent;
+            # both ChatOpenAI and ChatAnthropic accept this format in bind_tools.
+            return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+            # LangChain stamps messages with per-run ids; leave them out of the key
+            history = messages_to_dict(messages)
+            for message in history:
+                message["data"].pop("id", None)
+            request = {"messages": history, "stop": stop, "kwargs": dict(kwargs)}
+
+            if self.cassette.mode == "replay":
+                response = self.cassette.replay("chat", self.name, request)
+                if "error" in response:
+                    raise ReplayedProviderError(**response["error"])
+                generations = [
+                    ChatGeneration(
+                        message=messages_from_dict([g["message"]])[0],
+                        generation_info=g.get("generation_info"),
+                    )
+                    for g in response["generations"]
+                ]
+                return ChatResult(generations=generations, llm_output=response.get("llm_output"))
+
+            if self.inner is None:
+                self.inner = self.factory()
+            model = self.inner
+            tools = kwargs.pop("tools", None)
+            if tools:
+                bound = model.bind_tools(tools, **kwargs)
+                kwargs = dict(bound.kwargs)
+
+            start = time.perf_counter()
+            try:
+                result = model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                # Record failures too (e.g. 429s) so replay exercises the same fallback path
+                status = getattr(e, "status_code", None)
+                error = {
+                    "error_type": type(e).__name__,
+                    "message": str(e),
+                    "status_code": status if isinstance(status, int) else None,
+                }
+                self.cassette.record("chat", self.name, request, {"error": error}, time.perf_counter() - start)
+                raise
+            elapsed = time.perf_counter() - start
+
+            response = {
+                "generations": [
+                    {"message": message_to_dict(g.message), "generation_info": g.generation_info}
+                    for g in result.generations
+                ],
+                "llm_output": result.llm_output,
+            }
+            self.cassette.record("chat", self.name, request, response, elapsed)
+            return result
+
+    return RecordingChatModel
+
+
+def recordable_chat_model(name: str, factory: Callable[[], "BaseChatModel"]) -> "BaseChatModel":
+    """
+    Build a chat model that honours the active cassette.
+
+    Args:
+        name: Stable identifier for the call site (e.g. "code_gen")
+        factory: Zero-argument callable building the real chat model
+
+    Returns:
+        The real model when no cassette is active, otherwise a recording wrapper
+    """
+    cassette = active_cassette()
+    if cassette is None:
+        return factory()
+    return _recording_chat_model_class()(name=name, factory=factory, cassette=cassette)
+
+
+def recordable_tool(name: str, func: Callable[[str], str]) -> Callable[[str], str]:
+    """Wrap a single-string-input tool function so calls go through the active cassette"""
+    def wrapper(query: str) -> str:
+        cassette = active_cassette()
+        if cassette is None:
+            return func(query)
+        request = {"query": query}
+        if cassette.mode == "replay":
+            return cassette.replay("tool", name, request)
+        start = time.perf_counter()
+        response = func(query)
+        cassette.record("tool", name, request, response, time.perf_counter() - start)
+        return response
+
+    wrapper.__name__ = getattr(func, "__name__", name)
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def load_interactions(path: str) -> List[dict]:
+    """Read every interaction in a cassette file, e.g. to compare latencies across runs"""
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
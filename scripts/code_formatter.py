@@ -1,5 +1,5 @@
 from typing import Dict, List
-from agents.code_gen import ManimFile, ManimScene
+from agents.schemas import ManimFile, ManimScene
 
 
 def format_manim_scene(scene: ManimScene, imports: List[str]) -> str:
@@ -0,0 +1,150 @@
+import contextvars
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Type
+
+# HTTP statuses that mean "try another provider" rather than "the request is wrong"
+RETRYABLE_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class HedgeCancelled(Exception):
+    """Raised inside a losing request once another request has won"""
+
+
+def error_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a provider SDK error (openai/anthropic APIStatusError, httpx), if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """True for rate limits, overloads, server errors and connection failures"""
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # CassetteMissError: a replayed request that hedging abandoned while recording
+    return type(error).__name__ in (
+        "APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout", "CassetteMissError"
+    )
+
+
+class LatencyTracker:
+    """Rolling window of request latencies per key, for percentile hedge deadlines"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float):
+        with self._lock:
+            self._samples[key].append(seconds)
+
+    def percentile(self, key: str, p: float, min_samples: int = 5) -> Optional[float]:
+        """p-th percentile (0..1) of recorded latencies, or None with too few samples"""
+        with self._lock:
+            samples = sorted(self._samples[key])
+        if len(samples) < min_samples:
+            return None
+        index = min(int(p * len(samples)), len(samples) - 1)
+        return samples[index]
+
+
+latencies = LatencyTracker()
+
+
+def hedged_call(
+    legs: List[Callable[[threading.Event], Any]],
+    deadline: Optional[float],
+    is_valid: Callable[[Any], bool] = lambda result: not isinstance(result, Exception),
+    on_launch: Optional[Callable[[int, str], None]] = None,
+    abort_on: Tuple[Type[BaseException], ...] = ()
+) -> Any:
+    """
+    Run legs[0]; start the next leg if it is slow or fails with a retryable error.
+
+    Each leg receives a cancel Event, set once another leg has won, and should
+    stop at its next opportunity (raising HedgeCancelled). Legs run on daemon
+    threads, so a leg stuck inside a provider call is abandoned, not joined.
+
+    Args:
+        legs: Identical requests against different models, in preference order
+        deadline: Seconds to wait on the newest leg before hedging (None = only
+            fall back on errors)
+        is_valid: Whether a leg's return value is acceptable (first valid wins)
+        on_launch: Called with (leg index, reason) when a leg starts
+        abort_on: Exception types that end the whole call at once (e.g. the
+            job being cancelled) instead of waiting for the other legs
+
+    Returns:
+        First valid result. If none is valid, the last invalid result.
+
+    Raises:
+        The last leg's exception if every leg raised
+    """
+    results: "queue.Queue" = queue.Queue()
+    cancels: List[threading.Event] = []
+
+    def launch(reason: str):
+        index = len(cancels)
+        cancel = threading.Event()
+        cancels.append(cancel)
+        if on_launch:
+            on_launch(index, reason)
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                results.put((index, context.run(legs[index], cancel), None))
+            except BaseException as e:
+                results.put((index, None, e))
+
+        threading.Thread(target=run, name=f"hedge-leg-{index}", daemon=True).start()
+
+    launch("primary")
+    running = 1
+    last_launch = time.monotonic()
+    invalid_result: Any = None
+    has_invalid = False
+    last_error: Optional[BaseException] = None
+
+    while running:
+        can_hedge = len(cancels) < len(legs)
+        timeout = None
+        if can_hedge and deadline is not None:
+            timeout = max(0.0, last_launch + deadline - time.monotonic())
+        try:
+            index, result, error = results.get(timeout=timeout)
+        except queue.Empty:
+            launch("deadline")
+            running += 1
+            last_launch = time.monotonic()
+            continue
+
+        running -= 1
+        if isinstance(error, abort_on):
+            for cancel in cancels:
+                cancel.set()
+            raise error
+        if error is None and is_valid(result):
+            for i, cancel in enumerate(cancels):
+                if i != index:
+                    cancel.set()
+            return result
+
+        if error is None:
+            invalid_result, has_invalid = result, True
+        elif not isinstance(error, HedgeCancelled):
+            last_error = error
+            if is_retryable_error(error) and len(cancels) < len(legs):
+                launch(f"fallback:{error_status(error) or type(error).__name__}")
+                running += 1
+                last_launch = time.monotonic()
+
+    if has_invalid:
+        return invalid_result
+    raise last_error if last_error else RuntimeError("All hedged requests were cancelled")
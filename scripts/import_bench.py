@@ -0,0 +1,94 @@
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# Entry points that should start without pulling in LangChain or provider SDKs
+DEFAULT_MODULES = [
+    "agents.schemas",
+    "scripts.code_formatter",
+    "scripts.manim_validator",
+    "scripts.error_parser",
+    "main",
+]
+
+HEAVY_PREFIXES = ("langchain", "langchain_core", "langchain_openai", "langchain_anthropic", "openai", "anthropic", "requests")
+
+
+def time_import(module: str, runs: int = 5) -> float:
+    """Median wall time (seconds) of a fresh interpreter importing module"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def baseline_interpreter(runs: int = 5) -> float:
+    """Median wall time of an interpreter that imports nothing, to subtract from results"""
+    return time_import("sys", runs)
+
+
+def import_breakdown(module: str, top_n: int = 10) -> Tuple[List[Tuple[int, str]], List[str]]:
+    """
+    Run python -X importtime for module.
+
+    Returns:
+        (top_n slowest imports as (cumulative_us, name), heavy packages that got imported)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    entries = []
+    heavy = set()
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)", line)
+        if not match:
+            continue
+        name = match.group(2).strip()
+        entries.append((int(match.group(1)), name))
+        if name.split(".")[0] in HEAVY_PREFIXES:
+            heavy.add(name.split(".")[0])
+    entries.sort(reverse=True)
+    return entries[:top_n], sorted(heavy)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of pipeline entry points")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if any module exceeds this")
+    parser.add_argument("--details", action="store_true", help="show slowest nested imports")
+    args = parser.parse_args()
+
+    base = baseline_interpreter(args.runs)
+    print(f"Interpreter startup: {base * 1000:.0f} ms (subtracted below)\n")
+
+    results: Dict[str, float] = {}
+    for module in args.modules:
+        elapsed = max(time_import(module, args.runs) - base, 0.0)
+        results[module] = elapsed
+        top, heavy = import_breakdown(module)
+        heavy_note = f"  ⚠ imports {', '.join(heavy)}" if heavy else ""
+        print(f"{module:<28} {elapsed * 1000:8.0f} ms{heavy_note}")
+        if args.details:
+            for cumulative_us, name in top:
+                print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if args.budget_ms is not None:
+        over = [m for m, t in results.items() if t * 1000 > args.budget_ms]
+        if over:
+            print(f"\n✗ Over {args.budget_ms:.0f} ms budget: {', '.join(over)}")
+            sys.exit(1)
+        print(f"\n✓ All modules within {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == "__main__":
+    main()
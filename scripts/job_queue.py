@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+TERMINAL_STATUSES = ("succeeded", "failed", "cancelled")
+
+
+class JobQueue:
+    """
+    Persistent queue of lesson jobs and their progress events, in SQLite.
+
+    A job moves queued → running → succeeded | failed | cancelled. Every
+    status change and pipeline progress event is appended to the job's event
+    log with an increasing sequence number, so streams can resume after a
+    disconnect (SSE Last-Event-ID) or a service restart.
+    """
+
+    def __init__(self, path: str):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    max_retries INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    error TEXT,
+                    result TEXT
+                );
+                CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created);
+                CREATE TABLE IF NOT EXISTS events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    time REAL NOT NULL,
+                    kind TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+            """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _append(self, conn: sqlite3.Connection, job_id: str, kind: str, data: Dict[str, Any]) -> int:
+        seq = conn.execute(
+            "SELECT COALESCE(MAX(seq), 0) + 1 FROM events WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        conn.execute(
+            "INSERT INTO events (job_id, seq, time, kind, data) VALUES (?, ?, ?, ?, ?)",
+            (job_id, seq, time.time(), kind, json.dumps(data, default=str))
+        )
+        return seq
+
+    def submit(self, query: str, max_retries: int = 3) -> str:
+        """Queue a lesson; returns its job id"""
+        job_id = uuid.uuid4().hex[:12]
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, query, max_retries, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, query, max_retries, time.time())
+            )
+            self._append(conn, job_id, "status", {"status": "queued"})
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job running and return it, or None if the queue is empty"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row["id"]))
+            self._append(conn, row["id"], "status", {"status": "running"})
+            return dict(row, status="running")
+
+    def requeue_running(self) -> int:
+        """Put jobs left running by a previous service process back on the queue"""
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT id FROM jobs WHERE status = 'running'").fetchall()
+            for row in rows:
+                conn.execute("UPDATE jobs SET status = 'queued', started = NULL WHERE id = ?", (row["id"],))
+                self._append(conn, row["id"], "status", {"status": "queued", "requeued": True})
+            return len(rows)
+
+    def add_event(self, job_id: str, kind: str, data: Dict[str, Any]) -> int:
+        with self._transaction() as conn:
+            return self._append(conn, job_id, kind, data)
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None, result: Optional[Dict[str, Any]] = None):
+        """Record a job's terminal status (one of TERMINAL_STATUSES)"""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?, result = ? WHERE id = ?",
+                (status, time.time(), error, json.dumps(result) if result is not None else None, job_id)
+            )
+            data: Dict[str, Any] = {"status": status}
+            if error:
+                data["error"] = error
+            self._append(conn, job_id, "status", data)
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a job. Queued jobs are cancelled at once; running jobs are
+        flagged and stop at their next checkpoint.
+
+        Returns:
+            The job's status afterwards, or None if there is no such job
+        """
+        with self._transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == "queued":
+                conn.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ?", (time.time(), job_id))
+                self._append(conn, job_id, "status", {"status": "cancelled"})
+                return "cancelled"
+            if row["status"] == "running":
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            return row["status"]
+
+    def cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def events(self, job_id: str, after: int = 0) -> List[Dict[str, Any]]:
+        """Events with seq > after, oldest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, time, kind, data FROM events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after)
+            ).fetchall()
+        return [{"seq": r["seq"], "time": r["time"], "kind": r["kind"], "data": json.loads(r["data"])} for r in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Job counts by status and mean run time of finished jobs"""
+        with self._lock:
+            counts = {
+                row["status"]: row["n"]
+                for row in self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")
+            }
+            mean = self._conn.execute(
+                "SELECT AVG(finished - started) FROM jobs WHERE status = 'succeeded'"
+            ).fetchone()[0]
+        return {"jobs": counts, "mean_succeeded_seconds": mean}
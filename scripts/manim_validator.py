@@ -1,10 +1,32 @@
 import tempfile
 import subprocess
 import re
+import os
+import signal
+import threading
+import time
+import warnings
+import contextvars
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional
 from dataclasses import dataclass
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from scripts.tracing import span
+
+# Rough resident memory of one `manim --dry_run` process, used to size concurrency
+MANIM_PROCESS_MB = 300
+
+# Timeout scaling: base seconds plus per-animation / per-object allowances, capped
+BASE_TIMEOUT = 10.0
+TIMEOUT_PER_ANIMATION = 0.5
+TIMEOUT_PER_OBJECT = 0.2
+MAX_TIMEOUT = 60.0
+
+# How often the process-wide manim cap is re-sized from current free memory
+SLOT_REFRESH_SECONDS = 5.0
+
+# How often a running dry run checks whether its caller has stopped listening
+CANCEL_POLL_SECONDS = 0.2
 
 
 @dataclass
@@ -42,7 +64,160 @@ def extract_scene_id(code: str) -> str:
     return extract_class_name(code)
 
 
-def validate_manim_scene(code: str, class_name: str, filename: str) -> ValidationResult:
+def _available_memory_mb() -> Optional[int]:
+    """MemAvailable from /proc/meminfo, falling back to free physical pages"""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // 2**20
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_max_workers(reserved_mb: int = 0) -> int:
+    """
+    Size validator concurrency from usable CPUs and available memory.
+
+    THEOREM_VALIDATOR_WORKERS overrides the computed value (ignored, with a
+    warning, if it isn't an integer).
+
+    Args:
+        reserved_mb: Memory held by manim processes already running, counted
+            as available since their slots are part of the total
+    """
+    override = os.getenv("THEOREM_VALIDATOR_WORKERS")
+    if override:
+        try:
+            return max(1, int(override))
+        except ValueError:
+            warnings.warn(f"Ignoring THEOREM_VALIDATOR_WORKERS={override!r}: not an integer")
+
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    workers = cpus
+    memory_mb = _available_memory_mb()
+    if memory_mb is not None:
+        workers = min(workers, (memory_mb + reserved_mb) // MANIM_PROCESS_MB)
+    return max(1, workers)
+
+
+class _ProcessSlots:
+    """
+    Process-wide cap on concurrent manim processes, shared by every pipeline job
+    running in this process (each validate_manim_scene call holds one slot).
+
+    Sized on first use and re-sized at most every SLOT_REFRESH_SECONDS from
+    current CPU affinity and free memory, so a long-running service tracks
+    memory pressure instead of the value at import time.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._in_use = 0
+        self._limit: Optional[int] = None
+        self._checked = 0.0
+
+    def _capacity(self) -> int:
+        now = time.monotonic()
+        if self._limit is None or now - self._checked >= SLOT_REFRESH_SECONDS:
+            self._limit = default_max_workers(reserved_mb=self._in_use * MANIM_PROCESS_MB)
+            self._checked = now
+        return self._limit
+
+    def __enter__(self):
+        with self._condition:
+            while self._in_use >= self._capacity():
+                self._condition.wait(timeout=SLOT_REFRESH_SECONDS)
+            self._in_use += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+
+_global_slots = _ProcessSlots()
+
+
+def scene_timeout(code: str) -> float:
+    """
+    Dry-run timeout scaled by scene complexity (animation and object counts).
+
+    Args:
+        code: Python code containing Manim scene
+
+    Returns:
+        Timeout in seconds, between BASE_TIMEOUT and MAX_TIMEOUT
+    """
+    animations = len(re.findall(r'self\.play\(', code))
+    objects = len(re.findall(r'^\s+\w+\s*=', code, re.MULTILINE))
+    timeout = BASE_TIMEOUT + TIMEOUT_PER_ANIMATION * animations + TIMEOUT_PER_OBJECT * objects
+    return min(timeout, MAX_TIMEOUT)
+
+
+def _kill_group(process: subprocess.Popen):
+    # manim spawns children (ffmpeg, LaTeX); killing only the leader would orphan them
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _run_in_process_group(
+    args: List[str],
+    timeout: float,
+    cancel: Optional[threading.Event] = None
+) -> subprocess.CompletedProcess:
+    """
+    Run a command in its own session; on timeout or cancel kill the whole process group.
+
+    Returns:
+        The completed process (killed by SIGKILL if cancel was set)
+
+    Raises:
+        subprocess.TimeoutExpired: After the group has been killed and reaped
+    """
+    process = subprocess.Popen(
+        args,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True
+    )
+    deadline = time.monotonic() + timeout
+    poll = CANCEL_POLL_SECONDS if cancel is not None else timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            stdout, stderr = process.communicate(timeout=max(0.0, min(remaining, poll)))
+            return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            cancelled = cancel is not None and cancel.is_set()
+            if not cancelled and time.monotonic() < deadline:
+                continue
+            _kill_group(process)
+            stdout, stderr = process.communicate()
+            if cancelled:
+                return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+            raise subprocess.TimeoutExpired(args, timeout, stdout, stderr)
+
+
+def validate_manim_scene(
+    code: str,
+    class_name: str,
+    filename: str,
+    timeout: Optional[float] = None,
+    cancel: Optional[threading.Event] = None
+) -> ValidationResult:
     """
     Validate single Manim scene by running manim --dry_run.
 
@@ -50,11 +225,15 @@ def validate_manim_scene(code: str, class_name: str, filename: str) -> Validatio
         code: Python code containing Manim scene
         class_name: Name of Scene class to validate
         filename: Original filename (for error reporting)
+        timeout: Seconds before the dry run is killed (default: scene_timeout(code))
+        cancel: Once set, the dry run is skipped or killed and reported as cancelled
 
     Returns:
         ValidationResult with success status and error details
     """
     scene_id = extract_scene_id(code)
+    if timeout is None:
+        timeout = scene_timeout(code)
 
     # Write code to temp file
     with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
@@ -62,17 +241,31 @@ def validate_manim_scene(code: str, class_name: str, filename: str) -> Validatio
         temp_path = f.name
 
     try:
-        # Run manim --dry_run
-        result = subprocess.run(
-            ['manim', '--dry_run', temp_path, class_name],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        # Run manim --dry_run, holding one of the process-wide slots
+        # (a timeout is recorded on the span as a TimeoutExpired error)
+        with _global_slots:
+            if cancel is not None and cancel.is_set():
+                return ValidationResult(
+                    scene_id=scene_id,
+                    class_name=class_name,
+                    success=False,
+                    stderr="Error: Manim validation cancelled",
+                    code=code,
+                    filename=filename
+                )
+            with span("validate.scene", scene_id=scene_id, class_name=class_name, timeout=timeout) as s:
+                result = _run_in_process_group(
+                    ['manim', '--dry_run', temp_path, class_name],
+                    timeout=timeout,
+                    cancel=cancel
+                )
+                s.set("returncode", result.returncode)
 
         # Success if return code is 0
         success = result.returncode == 0
-        stderr = result.stderr
+        # Tracebacks name the random temp file; report the scene's own filename so
+        # retry feedback (and its cassette request key) is the same on every run
+        stderr = result.stderr.replace(temp_path, filename)
 
         return ValidationResult(
             scene_id=scene_id,
@@ -88,7 +281,7 @@ def validate_manim_scene(code: str, class_name: str, filename: str) -> Validatio
             scene_id=scene_id,
             class_name=class_name,
             success=False,
-            stderr="Error: Manim validation timed out after 10 seconds",
+            stderr=f"Error: Manim validation timed out after {timeout:g} seconds",
             code=code,
             filename=filename
         )
@@ -98,19 +291,24 @@ def validate_manim_scene(code: str, class_name: str, filename: str) -> Validatio
         Path(temp_path).unlink(missing_ok=True)
 
 
-def validate_all_scenes(code_files: Dict[str, str], max_workers: int = 4) -> List[ValidationResult]:
+def iter_validate_scenes(
+    code_files: Dict[str, str],
+    max_workers: Optional[int] = None
+) -> Iterator[ValidationResult]:
     """
-    Validate multiple Manim scenes in parallel.
+    Validate multiple Manim scenes in parallel, yielding each result as it completes.
 
     Args:
         code_files: Dict mapping filename to Python code
-        max_workers: Max parallel validations (default 4)
+        max_workers: Max parallel validations for this call (default: default_max_workers()).
+            Concurrency across all calls in the process is further capped by a shared limit.
 
-    Returns:
-        List of ValidationResult for each scene
-    """
-    results = []
+    Yields:
+        ValidationResult for each scene, fastest first
 
+    Closing the generator early (e.g. the caller raised JobCancelled) drops
+    queued dry runs and kills the running ones instead of waiting for them.
+    """
     # Extract (filename, code, class_name) tuples
     validation_tasks = []
     for filename, code in code_files.items():
@@ -119,37 +317,67 @@ def validate_all_scenes(code_files: Dict[str, str], max_workers: int = 4) -> Lis
             validation_tasks.append((filename, code, class_name))
         except ValueError as e:
             # No Scene class found - create error result
-            results.append(ValidationResult(
+            yield ValidationResult(
                 scene_id=filename,
                 class_name="Unknown",
                 success=False,
                 stderr=f"Error: {e}",
                 code=code,
                 filename=filename
-            ))
+            )
+
+    if not validation_tasks:
+        return
+
+    if max_workers is None:
+        max_workers = default_max_workers()
+    max_workers = min(max_workers, len(validation_tasks))
 
     # Run validations in parallel
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    cancel = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
         futures = {
-            executor.submit(validate_manim_scene, code, class_name, filename): filename
+            # Copy the caller's context so validation spans nest under the current span
+            executor.submit(
+                contextvars.copy_context().run, validate_manim_scene, code, class_name, filename, None, cancel
+            ): filename
             for filename, code, class_name in validation_tasks
         }
 
         for future in as_completed(futures):
             try:
-                result = future.result()
-                results.append(result)
+                yield future.result()
             except Exception as e:
                 filename = futures[future]
                 # Find original code for this filename
                 code = code_files[filename]
-                results.append(ValidationResult(
+                yield ValidationResult(
                     scene_id=filename,
                     class_name="Unknown",
                     success=False,
                     stderr=f"Validation error: {str(e)}",
                     code=code,
                     filename=filename
-                ))
+                )
+    finally:
+        # No-op once every scene is done; otherwise the caller stopped listening
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
 
-    return results
+def validate_all_scenes(
+    code_files: Dict[str, str],
+    max_workers: Optional[int] = None
+) -> List[ValidationResult]:
+    """
+    Validate multiple Manim scenes in parallel.
+
+    Args:
+        code_files: Dict mapping filename to Python code
+        max_workers: Max parallel validations (default: sized from CPUs and memory)
+
+    Returns:
+        List of ValidationResult for each scene
+    """
+    return list(iter_validate_scenes(code_files, max_workers))
@@ -0,0 +1,165 @@
+import ast
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+from agents.schemas import ManimFile, ManimScene, ScenePlan, SceneDescription, ScriptGeneration
+
+# Manim's default run_time for self.play() without an explicit run_time
+DEFAULT_RUN_TIME = 1.0
+
+
+@dataclass
+class ConformanceViolation:
+    """Structural mismatch between a ScenePlan and the generated ManimScene"""
+    scene_id: str
+    kind: str  # e.g. "missing_animation", "undefined_variable", "duration_mismatch"
+    message: str
+    severity: str = "error"  # "error" rejects the generation; "warning" is advisory
+
+
+def _names_used(source: str) -> Set[str]:
+    """Identifiers read by a code fragment; empty if the fragment doesn't parse"""
+    try:
+        tree = ast.parse(source.strip())
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)}
+
+
+def _names_assigned(source: str) -> Set[str]:
+    """Identifiers bound by a code fragment (assignment targets)"""
+    try:
+        tree = ast.parse(source.strip())
+    except SyntaxError:
+        return set()
+    return {node.id for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)}
+
+
+def _check_variables(scene: ManimScene) -> List[ConformanceViolation]:
+    """
+    Check object variables are valid, unique and not used before definition.
+
+    Only names that are this scene's own object variables are checked, so
+    Manim globals (Circle, BLUE, UP, ...) never produce false positives.
+    "Defined before use" covers setup code and object constructors only:
+    names in animation calls are not checked, since every object is defined
+    before construct() plays anything; the dry run catches unknown names there.
+    """
+    violations = []
+    object_vars = [obj.var_name for obj in scene.objects]
+
+    seen = set()
+    for var_name in object_vars:
+        if not var_name.isidentifier():
+            violations.append(ConformanceViolation(
+                scene.scene_id, "invalid_variable", f"'{var_name}' is not a valid Python variable name"
+            ))
+        if var_name in seen:
+            violations.append(ConformanceViolation(
+                scene.scene_id, "duplicate_variable", f"Variable '{var_name}' is defined by more than one object"
+            ))
+        seen.add(var_name)
+
+    # Setup code runs before any object is constructed
+    setup_defined = set()
+    for line in scene.setup_code or []:
+        early = (_names_used(line) & set(object_vars)) - setup_defined
+        for name in sorted(early):
+            violations.append(ConformanceViolation(
+                scene.scene_id, "undefined_variable", f"Setup code uses '{name}' before its object is defined"
+            ))
+        setup_defined |= _names_assigned(line)
+
+    for index, obj in enumerate(scene.objects):
+        defined = setup_defined | set(object_vars[:index])
+        later = set(object_vars[index:]) - defined
+        for name in sorted(_names_used(obj.constructor) & later):
+            violations.append(ConformanceViolation(
+                scene.scene_id,
+                "undefined_variable",
+                f"Object '{obj.object_id}' uses '{name}' before it is defined"
+            ))
+
+    return violations
+
+
+def _target_duration(plan: ScenePlan, beat_durations: Dict[str, float]) -> Optional[float]:
+    """Beat duration if known, else the sum of action durations if every action has one"""
+    if plan.beat_id in beat_durations:
+        return beat_durations[plan.beat_id]
+    durations = [action.duration for action in plan.actions]
+    if durations and all(d is not None for d in durations):
+        return sum(durations)
+    return None
+
+
+def check_plan_conformance(
+    scene_description: SceneDescription,
+    manim_file: ManimFile,
+    script: Optional[ScriptGeneration] = None,
+    duration_tolerance: float = 0.25
+) -> List[ConformanceViolation]:
+    """
+    Structurally compare generated code against the scene plan, without running Manim.
+
+    Args:
+        scene_description: SceneDescription the code was generated from
+        manim_file: ManimFile produced by the code_gen agent
+        script: ScriptGeneration supplying Beat.duration (falls back to Action.duration)
+        duration_tolerance: Allowed relative deviation of summed run_time from the beat
+
+    Returns:
+        List of violations (empty if the code conforms)
+    """
+    violations = []
+    plans = {plan.scene_id: plan for plan in scene_description.scenes}
+    beat_durations = {beat.beat_id: beat.duration for beat in script.beats} if script else {}
+    generated = set()
+
+    for scene in manim_file.scenes:
+        plan = plans.get(scene.scene_id)
+        if plan is None:
+            violations.append(ConformanceViolation(
+                scene.scene_id, "unknown_scene", f"Scene '{scene.scene_id}' does not match any ScenePlan.scene_id"
+            ))
+            continue
+        generated.add(scene.scene_id)
+
+        animation_ids = {animation.animation_id for animation in scene.animations}
+        for action in plan.actions:
+            if action.action_id not in animation_ids:
+                violations.append(ConformanceViolation(
+                    scene.scene_id,
+                    "missing_animation",
+                    f"Action '{action.action_id}' ({action.action_type}: {action.description}) has no ManimAnimation"
+                ))
+
+        object_ids = {obj.object_id for obj in scene.objects}
+        for obj in plan.objects:
+            if obj.object_id not in object_ids:
+                violations.append(ConformanceViolation(
+                    scene.scene_id, "missing_object", f"Object '{obj.object_id}' ({obj.type}) has no ManimObject"
+                ))
+
+        violations.extend(_check_variables(scene))
+
+        target = _target_duration(plan, beat_durations)
+        if target:
+            total = sum(
+                animation.run_time if animation.run_time is not None else DEFAULT_RUN_TIME
+                for animation in scene.animations
+            )
+            if abs(total - target) > max(duration_tolerance * target, DEFAULT_RUN_TIME):
+                violations.append(ConformanceViolation(
+                    scene.scene_id,
+                    "duration_mismatch",
+                    f"Animations run for {total:.1f}s but beat '{plan.beat_id}' lasts {target:.1f}s",
+                    severity="warning"
+                ))
+
+    for scene_id in plans:
+        if scene_id not in generated:
+            violations.append(ConformanceViolation(
+                scene_id, "missing_scene", f"ScenePlan '{scene_id}' has no generated ManimScene"
+            ))
+
+    return violations
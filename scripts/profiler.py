@@ -0,0 +1,271 @@
+import cProfile
+import contextvars
+import io
+import pstats
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+@dataclass
+class StageProfile:
+    """CPU profile of one pipeline stage"""
+    name: str
+    wall_seconds: float
+    stats: pstats.Stats
+
+
+@dataclass
+class MemorySection:
+    """tracemalloc result for one call of an instrumented section"""
+    name: str
+    peak_bytes: int
+    net_bytes: int
+    top_sites: List[str] = field(default_factory=list)
+
+
+class _StageRecord:
+    """Worker-thread profiles for a stage, merged into its stats as they finish"""
+
+    def __init__(self):
+        self.owner = threading.get_ident()
+        self.parts: List[cProfile.Profile] = []
+        self.result: Optional[StageProfile] = None
+        self.lock = threading.Lock()
+
+    def merge(self, profile: cProfile.Profile):
+        with self.lock:
+            if self.result is None:
+                self.parts.append(profile)
+            else:
+                # Finished after its stage (e.g. an abandoned hedge request)
+                self.result.stats.add(profile)
+
+
+# Stage being profiled; copied into threads started with the caller's context
+_current_stage: contextvars.ContextVar = contextvars.ContextVar("profile_stage", default=None)
+
+
+class StackSampler:
+    """
+    Sampling profiler producing flamegraph-compatible collapsed stacks.
+
+    Samples every thread (including validator workers, which cProfile misses)
+    and prefixes each stack with the stage active at sample time.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stage = "idle"
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(self.stage)
+                self.counts[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path: Path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class PipelineProfiler:
+    """
+    Collects per-stage cProfile stats, tracemalloc sections and sampled stacks.
+
+    Usage:
+        profiler = PipelineProfiler("profile")
+        with activate(profiler):
+            run_pipeline(query)
+        profiler.write_report()
+    """
+
+    def __init__(self, output_dir: str = "profile", top_n: int = 15):
+        self.output_dir = Path(output_dir)
+        self.top_n = top_n
+        self.stages: List[StageProfile] = []
+        self.memory: List[MemorySection] = []
+        self.sampler = StackSampler()
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def stage(self, name: str):
+        profile = cProfile.Profile()
+        record = _StageRecord()
+        token = _current_stage.set(record)
+        self.sampler.stage = name
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            _current_stage.reset(token)
+            self.sampler.stage = "idle"
+            with record.lock:
+                stats = pstats.Stats(profile)
+                for part in record.parts:
+                    stats.add(part)
+                record.result = StageProfile(name, time.perf_counter() - start, stats)
+            self.stages.append(record.result)
+
+    @contextmanager
+    def memory_section(self, name: str):
+        # tracemalloc is process-wide; serialise sections so their numbers stay attributable
+        with self._lock:
+            if tracemalloc.is_tracing():
+                # Nested section: already accounted for by the enclosing one
+                yield
+                return
+            tracemalloc.start(25)
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            base, _ = tracemalloc.get_traced_memory()
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                top = after.compare_to(before, "lineno")[:self.top_n]
+                self.memory.append(MemorySection(
+                    name=name,
+                    peak_bytes=peak - base,
+                    net_bytes=current - base,
+                    top_sites=[str(stat) for stat in top],
+                ))
+
+    def write_report(self) -> Path:
+        """Write report.txt, one .prof file per stage and stacks.collapsed; return the report path"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        lines = ["PIPELINE PROFILE", "=" * 60, ""]
+
+        own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        lines.append(f"Peak RSS (pipeline process): {own * scale / 2**20:.1f} MiB")
+        lines.append(f"Peak RSS (largest child, e.g. manim): {children * scale / 2**20:.1f} MiB")
+        lines.append("")
+
+        lines.append("STAGES BY WALL TIME")
+        for stage in sorted(self.stages, key=lambda s: s.wall_seconds, reverse=True):
+            lines.append(f"  {stage.name:<24} {stage.wall_seconds:8.2f}s")
+        lines.append("")
+
+        for stage in self.stages:
+            stage.stats.dump_stats(str(self.output_dir / f"{stage.name}.prof"))
+            buffer = io.StringIO()
+            stage.stats.stream = buffer
+            stage.stats.sort_stats("cumulative").print_stats(self.top_n)
+            lines.append(f"━━━ {stage.name}: top {self.top_n} functions by cumulative time ━━━")
+            lines.append(buffer.getvalue().strip())
+            lines.append("")
+
+        by_section: Dict[str, List[MemorySection]] = {}
+        for section in self.memory:
+            by_section.setdefault(section.name, []).append(section)
+        for name, sections in by_section.items():
+            worst = max(sections, key=lambda s: s.peak_bytes)
+            lines.append(f"━━━ {name}: {len(sections)} call(s), worst peak {worst.peak_bytes / 1024:.1f} KiB ━━━")
+            lines.extend(f"  {site}" for site in worst.top_sites)
+            lines.append("")
+
+        self.sampler.write_collapsed(self.output_dir / "stacks.collapsed")
+        lines.append(f"Collapsed stacks: {self.output_dir / 'stacks.collapsed'} (feed to flamegraph.pl or speedscope)")
+
+        report_path = self.output_dir / "report.txt"
+        report_path.write_text("\n".join(lines) + "\n")
+        return report_path
+
+
+_active: Optional[PipelineProfiler] = None
+
+
+@contextmanager
+def activate(profiler: PipelineProfiler):
+    """Make profiler receive profile_stage()/memory_section() calls inside the block"""
+    global _active
+    previous = _active
+    _active = profiler
+    profiler.sampler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.sampler.stop()
+        _active = previous
+
+
+@contextmanager
+def profile_stage(name: str):
+    """CPU-profile a pipeline stage; no-op unless a profiler is active"""
+    if _active is None:
+        yield
+        return
+    with _active.stage(name):
+        yield
+
+
+@contextmanager
+def profile_thread():
+    """
+    CPU-profile work a stage hands to another thread (e.g. a hedged agent request).
+
+    cProfile only sees the thread that enabled it, so the thread runs its own
+    profiler, merged into the enclosing stage's stats when the block ends.
+    No-op outside a profiled stage or on the stage's own thread.
+    """
+    record = _current_stage.get()
+    if _active is None or record is None or record.owner == threading.get_ident():
+        yield
+        return
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows one active cProfile at a time; the sampler still covers this thread
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        record.merge(profile)
+
+
+@contextmanager
+def memory_section(name: str):
+    """Snapshot allocations around a hot section; no-op unless a profiler is active"""
+    if _active is None:
+        yield
+        return
+    with _active.memory_section(name):
+        yield
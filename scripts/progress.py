@@ -0,0 +1,78 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# (callback(kind, data), cancelled()) for the job running in this context; copied
+# into hedge leg threads like the current span
+_listener: contextvars.ContextVar = contextvars.ContextVar("progress_listener", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised at the next progress checkpoint once a job's cancellation is requested"""
+
+
+@contextmanager
+def listen(callback: Callable[[str, Dict[str, Any]], None], cancelled: Optional[Callable[[], bool]] = None):
+    """
+    Receive the pipeline's progress events for the block.
+
+    Args:
+        callback: Called with (kind, data) for each event, e.g.
+            ("stage", {"stage": "code", "status": "started"})
+        cancelled: Polled at each checkpoint; once it returns True the
+            pipeline raises JobCancelled
+    """
+    token = _listener.set((callback, cancelled))
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def is_cancelled() -> bool:
+    """Whether the current job has been cancelled (False outside listen())"""
+    current = _listener.get()
+    return current is not None and current[1] is not None and current[1]()
+
+
+def check_cancelled():
+    """Raise JobCancelled if the current job has been cancelled (no-op outside listen())"""
+    if is_cancelled():
+        raise JobCancelled()
+
+
+def _send(kind: str, data: Dict[str, Any]):
+    current = _listener.get()
+    if current is not None:
+        current[0](kind, data)
+
+
+def emit(kind: str, **data):
+    """
+    Report a progress event (no-op when nobody is listening).
+
+    Kinds: "stage" (started/finished/failed), "validation" (one scene's
+    dry run), "scene" (validated scene code) and "artifact" (file written).
+    """
+    check_cancelled()
+    _send(kind, data)
+
+
+@contextmanager
+def stage(name: str):
+    """Emit started/finished/failed events around a pipeline stage"""
+    emit("stage", stage=name, status="started")
+    start = time.perf_counter()
+    try:
+        yield
+        check_cancelled()
+    except BaseException as e:
+        _send("stage", {
+            "stage": name,
+            "status": "cancelled" if isinstance(e, JobCancelled) else "failed",
+            "seconds": round(time.perf_counter() - start, 3),
+            "error": type(e).__name__,
+        })
+        raise
+    _send("stage", {"stage": name, "status": "finished", "seconds": round(time.perf_counter() - start, 3)})
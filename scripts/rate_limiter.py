@@ -0,0 +1,362 @@
+import contextvars
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Waiters whose process died stop heartbeating and are dropped after this long
+STALE_WAITER_SECONDS = 30.0
+POLL_SECONDS = 0.05
+MAX_POLL_SECONDS = 1.0
+# How often a waiting request checks whether it has been cancelled
+CANCEL_POLL_SECONDS = 0.2
+# Block a model this long after a 429 that carries no Retry-After header
+DEFAULT_RETRY_AFTER_SECONDS = 1.0
+# Statuses meaning the whole provider is overloaded, not just one model's limit
+PROVIDER_WIDE_STATUSES = {503, 529}
+
+# (job id, priority) of the lesson whose LLM calls are being made; copied into
+# hedge leg threads along with the rest of the context
+_job: contextvars.ContextVar = contextvars.ContextVar("rate_limit_job", default=("default", 0.0))
+
+
+@contextmanager
+def job_context(job_id: Optional[str] = None, priority: Optional[float] = None):
+    """
+    Attribute LLM calls in the block to a job, at a scheduling priority.
+
+    Either argument may be omitted to keep the enclosing block's value, so a
+    pipeline sets the job once and stages only raise the priority.
+
+    Args:
+        job_id: Lesson the calls belong to (fair share is per job)
+        priority: Higher is served first when a bucket is contended
+    """
+    current_id, current_priority = _job.get()
+    token = _job.set((
+        job_id if job_id is not None else current_id,
+        priority if priority is not None else current_priority
+    ))
+    try:
+        yield
+    finally:
+        _job.reset(token)
+
+
+def current_job_id() -> str:
+    """Id of the job in the current job context ("default" outside job_context())"""
+    return _job.get()[0]
+
+
+def job_priority() -> float:
+    """Scheduling priority of the current job context"""
+    return _job.get()[1]
+
+
+def estimate_tokens(messages: List[Any]) -> int:
+    """Rough prompt token count (~4 characters per token plus per-message overhead)"""
+    chars = sum(len(str(getattr(message, "content", message))) for message in messages)
+    return chars // 4 + 4 * len(messages)
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Seconds the provider asked us to wait, from a 429/503's Retry-After header.
+
+    Reads retry-after-ms and retry-after (delta seconds or an HTTP date) from
+    the SDK error's response headers. Returns None if there is no header.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Token buckets per provider and per provider/model, with a fair waiting queue.
+
+    Limits map a bucket key ("anthropic" or "anthropic/claude-3-5-haiku-20241022")
+    to {"rpm": requests per minute, "tpm": tokens per minute}; a bucket holds up
+    to one minute of capacity. A request must fit every bucket that applies.
+
+    When a bucket is contended, waiters are served highest priority first, then
+    the job that has been granted the fewest tokens (start-time fair queuing),
+    then first come. A waiter only holds up the buckets it shares with others
+    while those are what it waits for: one stalled on its own model's bucket
+    (e.g. blocked by a 429) lets other models of the provider go ahead.
+    Retry-After blocks a bucket until the given time.
+
+    State lives in SQLite: ":memory:" for a single process, or a file path
+    shared by every worker process on the machine.
+    """
+
+    def __init__(self, limits: Dict[str, Dict[str, float]], path: str = ":memory:"):
+        self.limits = limits
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    requests REAL NOT NULL,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    blocked_until REAL NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS waiters (
+                    id TEXT PRIMARY KEY,
+                    job TEXT NOT NULL,
+                    priority REAL NOT NULL,
+                    keys TEXT NOT NULL,
+                    tokens REAL NOT NULL,
+                    enqueued REAL NOT NULL,
+                    heartbeat REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job TEXT PRIMARY KEY,
+                    served REAL NOT NULL
+                );
+            """)
+
+    def bucket_keys(self, provider: str, model: str) -> List[str]:
+        """
+        Buckets a request to provider/model draws from. Both always apply, even
+        without configured limits, so Retry-After can block either one.
+        """
+        return [provider, f"{provider}/{model}"]
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _bucket(self, conn: sqlite3.Connection, key: str, now: float) -> Tuple[float, float, float]:
+        """(requests, tokens, blocked_until) for a bucket, refilled up to now"""
+        limit = self.limits.get(key, {})
+        rpm, tpm = limit.get("rpm", float("inf")), limit.get("tpm", float("inf"))
+        row = conn.execute(
+            "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return rpm, tpm, 0.0
+        requests, tokens, updated, blocked_until = row
+        elapsed = max(0.0, now - updated)
+        return (
+            min(rpm, requests + elapsed * rpm / 60),
+            min(tpm, tokens + elapsed * tpm / 60),
+            blocked_until
+        )
+
+    def _store(self, conn: sqlite3.Connection, key: str, requests: float, tokens: float, now: float, blocked_until: float):
+        # inf is not storable; an unlimited dimension is refilled to inf on read anyway
+        conn.execute(
+            "INSERT OR REPLACE INTO buckets (key, requests, tokens, updated, blocked_until) VALUES (?, ?, ?, ?, ?)",
+            (key, min(requests, 1e18), min(tokens, 1e18), now, blocked_until)
+        )
+
+    def _enqueue(self, waiter: str, job: str, priority: float, keys: List[str], tokens: int) -> float:
+        """Join the waiting queue; returns the enqueue time"""
+        now = time.time()
+        with self._transaction() as conn:
+            # A job joining the queue starts level with the least-served waiting job,
+            # so a new lesson doesn't monopolise buckets until it "catches up"
+            floor = conn.execute(
+                "SELECT MIN(j.served) FROM jobs j JOIN waiters w ON w.job = j.job"
+            ).fetchone()[0] or 0.0
+            conn.execute(
+                "INSERT INTO jobs (job, served) VALUES (?, ?) "
+                "ON CONFLICT(job) DO UPDATE SET served = MAX(served, excluded.served)",
+                (job, floor)
+            )
+            conn.execute(
+                "INSERT INTO waiters (id, job, priority, keys, tokens, enqueued, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (waiter, job, priority, json.dumps(keys), tokens, now, now)
+            )
+        return now
+
+    def _wait(self, states: Dict[str, Tuple[float, float, float]], keys: List[str], tokens: float, now: float) -> float:
+        """Seconds until a request of tokens fits every bucket in keys (0 if it fits now)"""
+        wait = 0.0
+        for key in keys:
+            requests, available, blocked_until = states[key]
+            limit = self.limits.get(key, {})
+            wait = max(wait, blocked_until - now)
+            if requests < 1:
+                wait = max(wait, (1 - requests) * 60 / limit["rpm"])
+            # A prompt larger than the bucket waits for a full bucket, then runs into debt
+            needed = min(tokens, limit.get("tpm", float("inf")))
+            if available < needed:
+                wait = max(wait, (needed - available) * 60 / limit["tpm"])
+        return wait
+
+    def _try_grant(
+        self,
+        waiter: str,
+        job: str,
+        priority: float,
+        keys: List[str],
+        tokens: int,
+        enqueued: float
+    ) -> float:
+        """Take capacity if no waiter ahead of this one is ready to use it and it fits; else seconds to wait"""
+        now = time.time()
+        with self._transaction() as conn:
+            # Refresh our own row first. If it was dropped as stale (e.g. this process
+            # was suspended past STALE_WAITER_SECONDS), rejoin at the original place.
+            conn.execute(
+                "INSERT INTO waiters (id, job, priority, keys, tokens, enqueued, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (waiter, job, priority, json.dumps(keys), tokens, enqueued, now)
+            )
+            conn.execute("DELETE FROM waiters WHERE heartbeat < ?", (now - STALE_WAITER_SECONDS,))
+            rows = conn.execute(
+                "SELECT w.id, w.priority, COALESCE(j.served, 0), w.enqueued, w.keys, w.tokens "
+                "FROM waiters w LEFT JOIN jobs j ON j.job = w.job"
+            ).fetchall()
+            order = {row[0]: (-row[1], row[2], row[3], row[0]) for row in rows}
+            states: Dict[str, Tuple[float, float, float]] = {}
+
+            def state(key: str) -> Tuple[float, float, float]:
+                if key not in states:
+                    states[key] = self._bucket(conn, key, now)
+                return states[key]
+
+            for other, _, _, _, other_keys, other_tokens in rows:
+                other_keys = json.loads(other_keys)
+                if other == waiter or not set(other_keys) & set(keys) or order[other] > order[waiter]:
+                    continue
+                # A waiter ahead of us holds the shared buckets only if nothing else stalls it
+                own_keys = [key for key in other_keys if key not in keys]
+                for key in own_keys:
+                    state(key)
+                if self._wait(states, own_keys, other_tokens, now) <= 0:
+                    return POLL_SECONDS
+
+            for key in keys:
+                state(key)
+            wait = self._wait(states, keys, tokens, now)
+            if wait > 0:
+                return wait
+
+            for key in keys:
+                requests, available, blocked_until = states[key]
+                self._store(conn, key, requests - 1, available - tokens, now, blocked_until)
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+            conn.execute("UPDATE jobs SET served = served + ? WHERE job = ?", (max(tokens, 1), job))
+            return 0.0
+
+    def _dequeue(self, waiter: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM waiters WHERE id = ?", (waiter,))
+
+    def acquire(
+        self,
+        provider: str,
+        model: str,
+        tokens: int,
+        cancelled: Optional[Callable[[], bool]] = None
+    ) -> float:
+        """
+        Block until a request of ~tokens fits the provider's and model's buckets.
+
+        Args:
+            provider: Provider name, e.g. "openai"
+            model: Provider model name
+            tokens: Estimated tokens the request will consume
+            cancelled: Polled while waiting; once it returns True, stop waiting
+                without taking capacity
+
+        Returns:
+            Seconds spent waiting
+        """
+        keys = self.bucket_keys(provider, model)
+        job, priority = _job.get()
+        waiter = uuid.uuid4().hex
+        start = time.monotonic()
+        enqueued = self._enqueue(waiter, job, priority, keys, tokens)
+        granted = False
+        try:
+            while True:
+                if cancelled is not None and cancelled():
+                    return time.monotonic() - start
+                wait = self._try_grant(waiter, job, priority, keys, tokens, enqueued)
+                if wait <= 0:
+                    granted = True
+                    return time.monotonic() - start
+                time.sleep(min(wait, CANCEL_POLL_SECONDS if cancelled is not None else MAX_POLL_SECONDS))
+        finally:
+            if not granted:
+                self._dequeue(waiter)
+
+    def settle(self, provider: str, model: str, tokens: int):
+        """Charge (or refund, if negative) the difference between estimated and actual tokens"""
+        now = time.time()
+        with self._transaction() as conn:
+            for key in self.bucket_keys(provider, model):
+                requests, available, blocked_until = self._bucket(conn, key, now)
+                self._store(conn, key, requests, available - tokens, now, blocked_until)
+
+    def block(self, provider: str, model: str, seconds: float, provider_wide: bool = False):
+        """
+        Honour a Retry-After: hold requests to model until seconds from now.
+
+        Args:
+            provider_wide: Hold every model of the provider (e.g. on an
+                overloaded 529), not just the one that was limited
+        """
+        now = time.time()
+        keys = self.bucket_keys(provider, model) if provider_wide else [f"{provider}/{model}"]
+        with self._transaction() as conn:
+            for key in keys:
+                requests, available, blocked_until = self._bucket(conn, key, now)
+                self._store(conn, key, requests, available, now, max(blocked_until, now + seconds))
+
+
+_shared: Optional[RateLimiter] = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter(limits: Dict[str, Dict[str, float]], path: Optional[str] = None) -> RateLimiter:
+    """
+    The process-wide RateLimiter, created on first use.
+
+    Args:
+        limits: Bucket limits (see RateLimiter)
+        path: SQLite file shared across worker processes (default: in-memory,
+            this process only)
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter(limits, path or ":memory:")
+        return _shared
@@ -0,0 +1,488 @@
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_COLLECTOR_URL = "http://127.0.0.1:4318/v1/traces"
+
+
+@dataclass
+class Span:
+    """One timed unit of pipeline work (stage, agent iteration, tool call, validation, retry)"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    end: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None  # Exception class name if the span failed
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount: float = 1):
+        """Increment a numeric counter attribute (token counts, tool calls, ...)"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class JsonLinesExporter:
+    """Append each finished span as one JSON line"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def to_otlp(spans: List[Span], service_name: str = "theorem") -> Dict[str, Any]:
+    """Encode spans as an OTLP/HTTP JSON trace export request"""
+    otlp_spans = []
+    for span in spans:
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(span.start * 1e9)),
+            "endTimeUnixNano": str(int((span.end or span.start) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        otlp_spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": "theorem.pipeline"}, "spans": otlp_spans}],
+        }]
+    }
+
+
+def _from_otlp_value(value: Dict[str, Any]) -> Any:
+    if "boolValue" in value:
+        return value["boolValue"]
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "doubleValue" in value:
+        return value["doubleValue"]
+    if "arrayValue" in value:
+        return [_from_otlp_value(v) for v in value["arrayValue"].get("values", [])]
+    return value.get("stringValue")
+
+
+def from_otlp(otlp_span: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode one OTLP JSON span into the Span.to_dict() shape used by trace files"""
+    start = int(otlp_span["startTimeUnixNano"]) / 1e9
+    end = int(otlp_span["endTimeUnixNano"]) / 1e9
+    status = otlp_span.get("status") or {}
+    return {
+        "name": otlp_span["name"],
+        "trace_id": otlp_span["traceId"],
+        "span_id": otlp_span["spanId"],
+        "parent_id": otlp_span.get("parentSpanId"),
+        "start": start,
+        "end": end,
+        "duration": end - start,
+        "attributes": {a["key"]: _from_otlp_value(a["value"]) for a in otlp_span.get("attributes", [])},
+        "error": status.get("message") if status.get("code") == 2 else None,
+    }
+
+
+class CollectorExporter:
+    """
+    POST spans as OTLP/HTTP JSON to a collector.
+
+    Works against a real OpenTelemetry collector or the stand-in from run_collector().
+    Spans are queued and sent in batches from a background thread, so a slow
+    or unreachable collector never stalls the run being traced. Export failures
+    are swallowed, and spans beyond max_queue are dropped.
+    """
+
+    def __init__(
+        self,
+        url: str = DEFAULT_COLLECTOR_URL,
+        timeout: float = 2.0,
+        max_batch: int = 256,
+        flush_interval: float = 1.0,
+        max_queue: int = 10000
+    ):
+        import atexit
+        import queue
+
+        self.url = url
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)  # Spans, or flush Events
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        import queue
+
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def flush(self, timeout: float = 5.0):
+        """Send everything queued so far (waits at most timeout seconds)"""
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait(timeout)
+
+    def _post(self, spans: List[Span]):
+        import urllib.request
+
+        body = json.dumps(to_otlp(spans), default=str).encode("utf-8")
+        request = urllib.request.Request(
+            self.url, data=body, headers={"Content-Type": "application/json"}, method="POST"
+        )
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except OSError:
+            pass
+
+    def _run(self):
+        import queue
+
+        while True:
+            batch: List[Span] = []
+            flushed: List[threading.Event] = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    flushed.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            if batch:
+                self._post(batch)
+            for done in flushed:
+                done.set()
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_exporters: List[Any] = []
+_exporters_lock = threading.Lock()
+_env_loaded = False
+
+
+def add_exporter(exporter):
+    """Register an object with an export(span) method"""
+    with _exporters_lock:
+        _exporters.append(exporter)
+
+
+def clear_exporters():
+    global _env_loaded
+    with _exporters_lock:
+        _exporters.clear()
+        _env_loaded = True
+
+
+def _configured_exporters() -> List[Any]:
+    """Exporters, configured on first use from THEOREM_TRACE_FILE / THEOREM_TRACE_COLLECTOR"""
+    global _env_loaded
+    with _exporters_lock:
+        if not _env_loaded:
+            _env_loaded = True
+            trace_file = os.getenv("THEOREM_TRACE_FILE")
+            if trace_file:
+                _exporters.append(JsonLinesExporter(trace_file))
+            collector_url = os.getenv("THEOREM_TRACE_COLLECTOR")
+            if collector_url:
+                _exporters.append(CollectorExporter(collector_url))
+        return list(_exporters)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, parent: Optional[Span] = None, **attributes) -> Span:
+    """Create a span without making it current (for callback-driven start/end pairs)"""
+    parent = parent if parent is not None else _current_span.get()
+    return Span(
+        name=name,
+        trace_id=parent.trace_id if parent else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        attributes=dict(attributes),
+    )
+
+
+def end_span(span: Span, error: Optional[BaseException] = None):
+    span.end = time.time()
+    if error is not None:
+        span.error = type(error).__name__
+    for exporter in _configured_exporters():
+        exporter.export(span)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a block as a child of the current span.
+
+    Usage:
+        with span("stage.script_gen", query=query) as s:
+            s.add("tool_calls")
+    """
+    s = start_span(name, **attributes)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        _current_span.reset(token)
+        end_span(s, e)
+        raise
+    _current_span.reset(token)
+    end_span(s)
+
+
+def token_usage(response) -> Dict[str, int]:
+    """
+    Extract input/output/cached token counts from a LangChain LLMResult.
+
+    cached_tokens are prompt tokens read from the provider's prompt cache
+    (Anthropic cache_read_input_tokens, OpenAI prompt_tokens_details.cached_tokens);
+    cache_write_tokens are tokens Anthropic wrote to the cache for later requests.
+    """
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                return {
+                    "input_tokens": usage.get("input_tokens", 0),
+                    "output_tokens": usage.get("output_tokens", 0),
+                    "cached_tokens": details.get("cache_read", 0) or 0,
+                    "cache_write_tokens": details.get("cache_creation", 0) or 0,
+                }
+    llm_output = response.llm_output or {}
+    usage = llm_output.get("token_usage") or llm_output.get("usage") or {}
+    return {
+        "input_tokens": usage.get("prompt_tokens", usage.get("input_tokens", 0)) or 0,
+        "output_tokens": usage.get("completion_tokens", usage.get("output_tokens", 0)) or 0,
+        "cached_tokens": usage.get("cache_read_input_tokens", 0) or 0,
+        "cache_write_tokens": usage.get("cache_creation_input_tokens", 0) or 0,
+    }
+
+
+def tracing_callbacks(stage_span: Span, rollup: Optional[Span] = None) -> list:
+    """
+    LangChain callback handlers recording AgentExecutor iterations and tool calls.
+
+    Each LLM call is one agent iteration span; each tool call gets its own span.
+    Token and tool-call counts are also rolled up onto stage_span (and rollup,
+    e.g. the stage span when stage_span is one of several hedged requests).
+    """
+    from langchain_core.callbacks import BaseCallbackHandler # pyright: ignore[reportMissingImports]
+
+    totals = [s for s in (stage_span, rollup) if s is not None]
+
+    def add(key: str, amount: float = 1):
+        for s in totals:
+            s.add(key, amount)
+
+    class TracingCallbackHandler(BaseCallbackHandler):
+        def __init__(self):
+            self.open_spans: Dict[Any, Span] = {}
+            self.iterations = 0
+
+        def _start(self, run_id, name: str, **attributes):
+            self.open_spans[run_id] = start_span(name, parent=stage_span, **attributes)
+
+        def _end(self, run_id, error: Optional[BaseException] = None) -> Optional[Span]:
+            s = self.open_spans.pop(run_id, None)
+            if s is not None:
+                end_span(s, error)
+            return s
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self.iterations += 1
+            add("iterations")
+            self._start(run_id, "agent.iteration", iteration=self.iterations)
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self.on_chat_model_start(serialized, [], run_id=run_id, **kwargs)
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            s = self.open_spans.get(run_id)
+            usage = token_usage(response)
+            for key, count in usage.items():
+                add(key, count)
+                if s is not None:
+                    s.set(key, count)
+            if usage["cached_tokens"]:
+                add("cache_hits")
+            self._end(run_id)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            add(f"errors.{type(error).__name__}")
+            self._end(run_id, error)
+
+        def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+            add("tool_calls")
+            tool_name = (serialized or {}).get("name", "tool")
+            self._start(run_id, f"tool.{tool_name}", input=str(input_str)[:200])
+
+        def on_tool_end(self, output, *, run_id, **kwargs):
+            s = self.open_spans.get(run_id)
+            if s is not None and str(output).startswith("Error"):
+                s.set("tool_error", str(output)[:200])
+            self._end(run_id)
+
+        def on_tool_error(self, error, *, run_id, **kwargs):
+            add(f"errors.{type(error).__name__}")
+            self._end(run_id, error)
+
+    return [TracingCallbackHandler()]
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    """
+    Aggregate a JSON-lines trace file into per-span-name totals.
+
+    Returns:
+        {
+            "spans": {name: {"count", "total_seconds", "errors"}},
+            "retries_by_error": {error_type: n},
+            "rungs": {model: {"attempts", "successes", "total_seconds"}},  # code_gen ladder
+            "tokens": {stage: {"input_tokens", "output_tokens", "cached_tokens",
+                               "cache_write_tokens", "cache_hit_rate"}},
+        }
+    """
+    spans: Dict[str, Dict[str, Any]] = {}
+    retries_by_error: Dict[str, int] = {}
+    rungs: Dict[str, Dict[str, Any]] = {}
+    tokens: Dict[str, Dict[str, Any]] = {}
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            s = json.loads(line)
+            stats = spans.setdefault(s["name"], {"count": 0, "total_seconds": 0.0, "errors": 0})
+            stats["count"] += 1
+            stats["total_seconds"] += s["duration"]
+            if s.get("error"):
+                stats["errors"] += 1
+            # Agent stage spans (agent.<stage>) carry usage rolled up from every request
+            stage = s["attributes"].get("stage")
+            if stage and s["name"] == f"agent.{stage}":
+                usage = tokens.setdefault(stage, {
+                    "input_tokens": 0, "output_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0
+                })
+                for key in usage:
+                    usage[key] += s["attributes"].get(key, 0)
+            if s["name"] == "code_gen.attempt":
+                succeeded = s["attributes"].get("outcome") == "ok"
+                rung = rungs.setdefault(
+                    s["attributes"].get("model", "unknown"),
+                    {"attempts": 0, "successes": 0, "total_seconds": 0.0}
+                )
+                rung["attempts"] += 1
+                rung["successes"] += int(succeeded)
+                rung["total_seconds"] += s["duration"]
+                if not succeeded:
+                    for error_type in s["attributes"].get("error_types", []) or ["Unknown"]:
+                        retries_by_error[error_type] = retries_by_error.get(error_type, 0) + 1
+    for usage in tokens.values():
+        usage["cache_hit_rate"] = usage["cached_tokens"] / usage["input_tokens"] if usage["input_tokens"] else 0.0
+    return {"spans": spans, "retries_by_error": retries_by_error, "rungs": rungs, "tokens": tokens}
+
+
+def run_collector(port: int = 4318, output: str = "traces.jsonl"):
+    """
+    Minimal local stand-in for an OpenTelemetry collector.
+
+    Accepts OTLP/HTTP JSON on /v1/traces and appends each span to output in the
+    same JSON-lines format as THEOREM_TRACE_FILE, so summarize() reads either.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    lock = threading.Lock()
+
+    class CollectorHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            with lock:
+                with open(output, "a") as f:
+                    for resource_spans in payload.get("resourceSpans", []):
+                        for scope_spans in resource_spans.get("scopeSpans", []):
+                            for s in scope_spans.get("spans", []):
+                                f.write(json.dumps(from_otlp(s)) + "\n")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), CollectorHandler)
+    print(f"Trace collector listening on http://127.0.0.1:{port}/v1/traces → {output}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run_collector()
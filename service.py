@@ -0,0 +1,296 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+from scripts.job_queue import JobQueue, TERMINAL_STATUSES
+from scripts.progress import JobCancelled, listen
+
+DEFAULT_WORKERS = 2
+SSE_POLL_SECONDS = 0.25
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+class JobService:
+    """
+    Runs queued lessons on a bounded pool of worker threads.
+
+    Each job runs run_pipeline() with its own output directory
+    (<data_dir>/jobs/<job_id>/) and its id as the rate-limiter job, and
+    writes its progress events to the JobQueue as they happen.
+    """
+
+    def __init__(self, data_dir: str = "service_data", workers: Optional[int] = None):
+        self.data_dir = Path(data_dir)
+        self.queue = JobQueue(str(self.data_dir / "jobs.db"))
+        self.workers = workers or int(os.getenv("THEOREM_SERVICE_WORKERS", DEFAULT_WORKERS))
+        self.started = time.time()
+        self._wake = threading.Condition()
+        self._stopping = False
+        self._running: Dict[str, threading.Event] = {}
+        self._running_lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        requeued = self.queue.requeue_running()
+        if requeued:
+            print(f"[Service] Requeued {requeued} jobs interrupted by the last shutdown")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+
+    def submit(self, query: str, max_retries: int = 3) -> str:
+        job_id = self.queue.submit(query, max_retries)
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        status = self.queue.cancel(job_id)
+        with self._running_lock:
+            if job_id in self._running:
+                self._running[job_id].set()
+        return status
+
+    def health(self) -> Dict[str, Any]:
+        with self._running_lock:
+            busy = len(self._running)
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "busy_workers": busy,
+            **self.queue.stats(),
+        }
+
+    def _worker(self):
+        while True:
+            with self._wake:
+                if self._stopping:
+                    return
+            job = self.queue.claim()
+            if job is None:
+                with self._wake:
+                    if not self._stopping:
+                        # Timeout also picks up jobs submitted by another process
+                        self._wake.wait(timeout=1.0)
+                continue
+            self._run(job)
+
+    def _run(self, job: Dict[str, Any]):
+        # Imported here so the service starts (and serves /health) without LangChain loaded
+        from main import run_pipeline
+        from agents.code_gen import ValidationFailedError
+        from agents.llm import release_fake_models
+
+        job_id = job["id"]
+        cancel = threading.Event()
+        if job["cancel_requested"]:
+            cancel.set()
+        with self._running_lock:
+            self._running[job_id] = cancel
+
+        def cancelled() -> bool:
+            # The queue flag also catches a cancel that landed between claim() and
+            # registering in _running, before cancel() could see this job
+            if not cancel.is_set() and self.queue.cancel_requested(job_id):
+                cancel.set()
+            return cancel.is_set()
+
+        def on_event(kind: str, data: Dict[str, Any]):
+            self.queue.add_event(job_id, kind, data)
+
+        try:
+            with listen(on_event, cancelled):
+                files = run_pipeline(
+                    job["query"],
+                    max_retries=job["max_retries"],
+                    output_dir=str(self.data_dir / "jobs" / job_id),
+                    job_id=job_id
+                )
+            self.queue.finish(job_id, "succeeded", result={"files": [str(f) for f in files]})
+        except JobCancelled:
+            self.queue.finish(job_id, "cancelled")
+        except ValidationFailedError as e:
+            failed = [r.class_name for r in e.validation_results if not r.success]
+            self.queue.finish(job_id, "failed", error=str(e), result={"failed_scenes": failed})
+        except Exception as e:
+            self.queue.finish(job_id, "failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            with self._running_lock:
+                self._running.pop(job_id, None)
+            release_fake_models(job_id)
+
+
+def _handler_class(service: JobService):
+    from http.server import BaseHTTPRequestHandler
+
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _json(self, status: int, body: Any):
+            payload = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _route(self):
+            return [p for p in urlsplit(self.path).path.split("/") if p]
+
+        def do_GET(self):
+            parts = self._route()
+            if parts == ["health"]:
+                return self._json(200, service.health())
+            if parts == ["metrics"]:
+                return self._metrics()
+            if len(parts) == 2 and parts[0] == "jobs":
+                job = service.queue.get(parts[1])
+                return self._json(200, job) if job else self._json(404, {"error": "No such job"})
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "events":
+                return self._events(parts[1])
+            self._json(404, {"error": "Not found"})
+
+        def do_POST(self):
+            parts = self._route()
+            if parts == ["jobs"]:
+                return self._submit()
+            if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+                return self._cancel(parts[1])
+            self._json(404, {"error": "Not found"})
+
+        def do_DELETE(self):
+            parts = self._route()
+            if len(parts) == 2 and parts[0] == "jobs":
+                return self._cancel(parts[1])
+            self._json(404, {"error": "Not found"})
+
+        def _submit(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError):
+                return self._json(400, {"error": "Body must be JSON"})
+            query = body.get("query") if isinstance(body, dict) else None
+            max_retries = body.get("max_retries", 3) if isinstance(body, dict) else 3
+            if not isinstance(query, str) or not query.strip():
+                return self._json(400, {"error": "'query' must be a non-empty string"})
+            if not isinstance(max_retries, int) or not 1 <= max_retries <= 10:
+                return self._json(400, {"error": "'max_retries' must be an integer from 1 to 10"})
+            job_id = service.submit(query.strip(), max_retries)
+            self._json(202, {"job_id": job_id, "status": "queued", "events": f"/jobs/{job_id}/events"})
+
+        def _cancel(self, job_id: str):
+            status = service.cancel(job_id)
+            if status is None:
+                return self._json(404, {"error": "No such job"})
+            self._json(202 if status == "running" else 200, {"job_id": job_id, "status": status})
+
+        def _events(self, job_id: str):
+            """Server-sent events: replays the job's log, then streams until it finishes"""
+            if service.queue.get(job_id) is None:
+                return self._json(404, {"error": "No such job"})
+            query = parse_qs(urlsplit(self.path).query)
+            try:
+                after = int(self.headers.get("Last-Event-ID") or query.get("after", ["0"])[0] or 0)
+            except ValueError:
+                return self._json(400, {"error": "Last-Event-ID and 'after' must be integer event ids"})
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            last_write = time.monotonic()
+            try:
+                while True:
+                    events = service.queue.events(job_id, after)
+                    for event in events:
+                        data = json.dumps(dict(event["data"], time=event["time"]), default=str)
+                        self.wfile.write(f"id: {event['seq']}\nevent: {event['kind']}\ndata: {data}\n\n".encode())
+                        after = event["seq"]
+                    if events:
+                        self.wfile.flush()
+                        last_write = time.monotonic()
+                    elif service.queue.get(job_id)["status"] in TERMINAL_STATUSES:
+                        return
+                    elif time.monotonic() - last_write > SSE_KEEPALIVE_SECONDS:
+                        self.wfile.write(b": keepalive\n\n")
+                        self.wfile.flush()
+                        last_write = time.monotonic()
+                    if not events:
+                        time.sleep(SSE_POLL_SECONDS)
+            except (BrokenPipeError, ConnectionResetError):
+                return
+
+        def _metrics(self):
+            """Prometheus text format"""
+            health = service.health()
+            lines = [
+                f"theorem_service_uptime_seconds {health['uptime_seconds']}",
+                f"theorem_service_workers {health['workers']}",
+                f"theorem_service_busy_workers {health['busy_workers']}",
+            ]
+            for status in ("queued", "running") + TERMINAL_STATUSES:
+                lines.append(f'theorem_service_jobs{{status="{status}"}} {health["jobs"].get(status, 0)}')
+            if health["mean_succeeded_seconds"] is not None:
+                lines.append(f"theorem_service_job_seconds_mean {health['mean_succeeded_seconds']:.3f}")
+            payload = ("\n".join(lines) + "\n").encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return JobRequestHandler
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, workers: Optional[int] = None, data_dir: str = "service_data"):
+    """
+    Run the local lesson service until interrupted.
+
+    Endpoints:
+        POST   /jobs               {"query", "max_retries"?} → 202 {"job_id"}
+        GET    /jobs/<id>          job status, error and written files
+        GET    /jobs/<id>/events   SSE stream of status, stage, validation,
+                                   scene and artifact events (resumes from
+                                   Last-Event-ID or ?after=<seq>)
+        POST   /jobs/<id>/cancel   (or DELETE /jobs/<id>) cancel a job
+        GET    /health             JSON liveness, worker and queue stats
+        GET    /metrics            the same stats in Prometheus text format
+
+    Point THEOREM_MODEL_CONFIG at fake models (agents/fake_llm.py) or set a
+    replay cassette to run fully offline.
+    """
+    from http.server import ThreadingHTTPServer
+
+    service = JobService(data_dir, workers)
+    service.start()
+    server = ThreadingHTTPServer((host, port), _handler_class(service))
+    server.daemon_threads = True
+    print(f"Lesson service listening on http://{host}:{port} ({service.workers} workers, data in {data_dir}/)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,107 @@
+import json
+import os
+import stat
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+FIXTURES = ROOT / "fixtures"
+
+
+@pytest.fixture
+def fake_manim(tmp_path, monkeypatch):
+    """
+    Put a stand-in `manim` on PATH: dry runs pass unless the scene class name
+    contains "Broken", which fails with a traceback naming the file like manim's
+    """
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    manim = bin_dir / "manim"
+    manim.write_text(
+        "#!/bin/sh\n"
+        "if grep -q Broken \"$2\"; then\n"
+        "  echo \"Traceback (most recent call last):\" >&2\n"
+        "  echo \"  File \\\"$2\\\", line 5, in construct\" >&2\n"
+        "  echo \"NameError: name 'Broken' is not defined\" >&2\n"
+        "  exit 1\n"
+        "fi\n"
+        "exit 0\n"
+    )
+    manim.chmod(manim.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return manim
+
+
+@pytest.fixture
+def model_config(tmp_path, monkeypatch):
+    """
+    Write a model config and make it the active one, with fresh fake models,
+    latency history and rate limiter. Returns a function taking the config dict.
+    """
+    import agents.llm as llm
+    import scripts.hedging as hedging
+    import scripts.rate_limiter as rate_limiter
+
+    monkeypatch.chdir(ROOT)  # prompts/ and fixtures/ are relative to the repo root
+    monkeypatch.delenv("THEOREM_CASSETTE", raising=False)
+    monkeypatch.delenv("THEOREM_RATE_LIMIT_DB", raising=False)
+    monkeypatch.setattr(rate_limiter, "_shared", None)
+
+    def use(config):
+        path = tmp_path / "models.json"
+        path.write_text(json.dumps(config))
+        monkeypatch.setenv("THEOREM_MODEL_CONFIG", str(path))
+        llm.load_model_config.cache_clear()
+        llm._fake_models.clear()
+        hedging.latencies._samples.clear()
+        return path
+
+    yield use
+    llm.load_model_config.cache_clear()
+    llm._fake_models.clear()
+
+
+def fake_rung(model, stage, **options):
+    """A fake-provider rung answering with the canned fixture for stage, unless responses are given"""
+    if "responses" not in options:
+        options["responses_file"] = str(FIXTURES / f"{stage}.json")
+    return {"provider": "fake", "model": model, "options": options}
+
+
+def fake_config(**overrides):
+    """Fast, deterministic fake models for every stage; overrides replace top-level sections"""
+    config = {
+        "stages": {
+            "script_gen": [fake_rung("script", "script_gen")],
+            "scene_gen": [fake_rung("scene", "scene_gen")],
+            "code_gen": [fake_rung("code", "code_gen")],
+        },
+        "fallbacks": {},
+        "hedging": {"default_deadline_seconds": None},
+        "rate_limits": {},
+    }
+    config.update(overrides)
+    return config
+
+
+def manim_file(*scene_ids, broken=()):
+    """The code_gen fixture's ManimFile, limited to scene_ids, with broken scenes renamed to fail dry runs"""
+    fixture = json.loads((FIXTURES / "code_gen.json").read_text())[0]
+    scenes = []
+    for scene in fixture["scenes"]:
+        if scene_ids and scene["scene_id"] not in scene_ids:
+            continue
+        if scene["scene_id"] in broken:
+            scene = dict(scene, class_name="Broken" + scene["class_name"])
+        scenes.append(scene)
+    return dict(fixture, scenes=scenes)
+
+
+def scene_description():
+    """The scene_gen fixture as a SceneDescription"""
+    from agents.schemas import SceneDescription
+    return SceneDescription.model_validate(json.loads((FIXTURES / "scene_gen.json").read_text())[0])
@@ -0,0 +1,31 @@
+import json
+
+from agents.schemas import ManimFile
+from scripts.cassette import load_interactions, use_cassette
+from conftest import fake_config, fake_rung, manim_file, scene_description
+
+
+def test_validation_retry_replays_from_the_recording(model_config, fake_manim, tmp_path):
+    from agents.code_gen import generate_code_with_validation
+
+    model_config(fake_config(stages={**fake_config()["stages"], "code_gen": [
+        fake_rung("code", "code_gen", responses=[manim_file(broken=("s1",)), manim_file("s1")])
+    ]}))
+    path = tmp_path / "run.jsonl"
+
+    with use_cassette(str(path), mode="record"):
+        recorded = generate_code_with_validation(scene_description(), max_retries=2)
+
+    interactions = load_interactions(str(path))
+    assert len(interactions) == 2
+    # The retry prompt names the scene file, not manim's random temp file
+    retry_prompt = json.dumps(interactions[1]["request"])
+    assert "s1.py" in retry_prompt
+    assert "/tmp" not in retry_prompt
+
+    with use_cassette(str(path), mode="replay"):
+        replayed = generate_code_with_validation(scene_description(), max_retries=2)
+
+    assert isinstance(replayed, ManimFile)
+    assert replayed == recorded
+    assert [s.class_name for s in replayed.scenes] == ["RightTriangle", "PythagoreanFormula"]
@@ -0,0 +1,68 @@
+import pytest
+
+from agents.schemas import ManimFile
+from scripts import tracing
+from conftest import fake_config, fake_rung, manim_file, scene_description
+
+
+class CollectSpans:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span.to_dict())
+
+
+@pytest.fixture
+def spans():
+    collector = CollectSpans()
+    tracing.clear_exporters()
+    tracing.add_exporter(collector)
+    yield collector.spans
+    tracing.clear_exporters()
+
+
+def test_failed_scene_escalates_to_the_next_rung_and_passed_scenes_are_kept(model_config, fake_manim, spans):
+    from agents.code_gen import generate_code_with_validation
+
+    retry = manim_file("s1")
+    retry["imports"] = ["from manim import *", "import numpy as np"]
+    model_config(fake_config(stages={**fake_config()["stages"], "code_gen": [
+        fake_rung("code-small", "code_gen", responses=[manim_file(broken=("s1",))]),
+        fake_rung("code-large", "code_gen", responses=[retry]),
+    ]}))
+
+    result = generate_code_with_validation(scene_description(), max_retries=3)
+
+    assert isinstance(result, ManimFile)
+    # Plan order, with s1 from the second rung and s2 kept from the first
+    assert [(s.scene_id, s.class_name) for s in result.scenes] == [
+        ("s1", "RightTriangle"), ("s2", "PythagoreanFormula")
+    ]
+    assert result.imports == ["from manim import *", "import numpy as np"]
+
+    attempts = [s["attributes"] for s in spans if s["name"] == "code_gen.attempt"]
+    assert [(a["attempt"], a["model"], a["scenes"], a["outcome"]) for a in attempts] == [
+        (1, "fake:code-small", 2, "validation_failed"),
+        (2, "fake:code-large", 1, "ok"),
+    ]
+    assert attempts[0]["failed_scenes"] == 1
+    assert attempts[0]["error_types"] == ["NameError"]
+
+
+def test_top_rung_is_reused_once_the_ladder_runs_out(model_config, fake_manim, spans):
+    from agents.code_gen import ValidationFailedError, generate_code_with_validation
+
+    model_config(fake_config(stages={**fake_config()["stages"], "code_gen": [
+        fake_rung("code-small", "code_gen", responses=[manim_file(broken=("s2",))]),
+        fake_rung("code-large", "code_gen", responses=[manim_file("s2", broken=("s2",))]),
+    ]}))
+
+    with pytest.raises(ValidationFailedError) as error:
+        generate_code_with_validation(scene_description(), max_retries=3)
+
+    assert [r.class_name for r in error.value.validation_results] == ["BrokenPythagoreanFormula"]
+    attempts = [s["attributes"] for s in spans if s["name"] == "code_gen.attempt"]
+    assert [(a["model"], a["scenes"]) for a in attempts] == [
+        ("fake:code-small", 2), ("fake:code-large", 1), ("fake:code-large", 1)
+    ]
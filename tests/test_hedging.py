@@ -0,0 +1,111 @@
+import threading
+import time
+
+import pytest
+
+from agents.fake_llm import FakeProviderError
+from agents.schemas import ScriptGeneration
+from scripts.hedging import hedged_call
+from conftest import fake_config, fake_rung
+
+
+def test_hedged_call_falls_back_on_retryable_error():
+    launches = []
+
+    def primary(cancel):
+        raise FakeProviderError(429)
+
+    result = hedged_call(
+        [primary, lambda cancel: "fallback"],
+        deadline=None,
+        on_launch=lambda index, reason: launches.append(reason)
+    )
+
+    assert result == "fallback"
+    assert launches == ["primary", "fallback:429"]
+
+
+def test_hedged_call_does_not_fall_back_on_other_errors():
+    launched = []
+
+    def primary(cancel):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        hedged_call(
+            [primary, lambda cancel: "fallback"],
+            deadline=None,
+            on_launch=lambda index, reason: launched.append(index)
+        )
+    assert launched == [0]
+
+
+def test_hedged_call_races_fallback_after_deadline_and_cancels_loser():
+    primary_cancel = []
+
+    def slow(cancel):
+        primary_cancel.append(cancel)
+        cancel.wait(5)
+        return "slow"
+
+    start = time.monotonic()
+    result = hedged_call([slow, lambda cancel: "fast"], deadline=0.1)
+
+    assert result == "fast"
+    assert time.monotonic() - start < 1
+    assert primary_cancel[0].is_set()
+
+
+def test_hedged_call_abort_on_stops_waiting_for_other_legs():
+    class Stop(Exception):
+        pass
+
+    release = threading.Event()
+
+    def slow(cancel):
+        release.wait(5)
+        return "slow"
+
+    def stopping(cancel):
+        raise Stop()
+
+    start = time.monotonic()
+    with pytest.raises(Stop):
+        hedged_call([slow, stopping], deadline=0.05, abort_on=(Stop,))
+    release.set()
+    assert time.monotonic() - start < 1
+
+
+def test_script_gen_falls_back_to_fallback_model_on_429(model_config, capsys):
+    from agents.script_gen import generate_script
+
+    model_config(fake_config(
+        stages={**fake_config()["stages"], "script_gen": [
+            fake_rung("script", "script_gen", error_rate=1.0, error_status=429)
+        ]},
+        fallbacks={"script_gen": [fake_rung("script-fallback", "script_gen")]},
+    ))
+
+    script = generate_script("Why is the Pythagorean theorem true?")
+
+    assert isinstance(script, ScriptGeneration)
+    assert "Racing fake:script-fallback (fallback:429)" in capsys.readouterr().out
+
+
+def test_script_gen_hedges_a_slow_primary(model_config, capsys):
+    from agents.script_gen import generate_script
+
+    model_config(fake_config(
+        stages={**fake_config()["stages"], "script_gen": [
+            fake_rung("script", "script_gen", latency={"distribution": "fixed", "seconds": 5})
+        ]},
+        fallbacks={"script_gen": [fake_rung("script-fallback", "script_gen")]},
+        hedging={"default_deadline_seconds": 0.3},
+    ))
+
+    start = time.monotonic()
+    script = generate_script("Why is the Pythagorean theorem true?")
+
+    assert isinstance(script, ScriptGeneration)
+    assert time.monotonic() - start < 3
+    assert "Racing fake:script-fallback (deadline)" in capsys.readouterr().out
@@ -0,0 +1,99 @@
+import os
+import stat
+import time
+
+import pytest
+
+import scripts.manim_validator as manim_validator
+from scripts.manim_validator import (
+    MAX_TIMEOUT, default_max_workers, iter_validate_scenes, scene_timeout, validate_manim_scene
+)
+
+# Long enough for a running dry run to notice the cancel and kill its group
+CANCEL_WAIT = 0.6
+
+
+def scene(class_name: str) -> str:
+    return f"from manim import *\n\nclass {class_name}(Scene):\n    def construct(self):\n        pass\n"
+
+
+def alive(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] not in "ZX"  # zombies are dead but unreaped
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def hanging_manim(tmp_path, monkeypatch):
+    """
+    Stand-in `manim` whose "Hang" scenes start a child that outlives the leader
+    (like ffmpeg) and never finish; each records its child's pid under pids/<class>.
+    Returns the pids directory.
+    """
+    bin_dir, pids = tmp_path / "bin", tmp_path / "pids"
+    bin_dir.mkdir()
+    pids.mkdir()
+    manim = bin_dir / "manim"
+    manim.write_text(
+        "#!/bin/sh\n"
+        "if grep -q Hang \"$2\"; then\n"
+        f"  sleep 300 & echo $! > {pids}/$3\n"
+        "  wait\n"
+        "fi\n"
+        "exit 0\n"
+    )
+    manim.chmod(manim.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setenv("THEOREM_VALIDATOR_WORKERS", "2")
+    monkeypatch.setattr(manim_validator, "_global_slots", manim_validator._ProcessSlots())
+    return pids
+
+
+@pytest.mark.parametrize("code, expected", [
+    (scene("Empty"), 10.0),
+    (scene("Busy") + "        self.play(a)\n" * 4 + "        b = Circle()\n" * 5, 13.0),
+    (scene("Huge") + "        self.play(a)\n" * 500, MAX_TIMEOUT),
+])
+def test_scene_timeout_scales_with_complexity(code, expected):
+    assert scene_timeout(code) == pytest.approx(expected)
+
+
+def test_worker_override_is_validated(monkeypatch):
+    monkeypatch.setenv("THEOREM_VALIDATOR_WORKERS", "3")
+    assert default_max_workers() == 3
+
+    monkeypatch.setenv("THEOREM_VALIDATOR_WORKERS", "lots")
+    with pytest.warns(UserWarning, match="THEOREM_VALIDATOR_WORKERS"):
+        assert default_max_workers() >= 1
+
+
+def test_timeout_kills_the_whole_process_group(hanging_manim):
+    start = time.monotonic()
+    result = validate_manim_scene(scene("Hang"), "Hang", "s1.py", timeout=0.5)
+
+    assert not result.success
+    assert "timed out after 0.5 seconds" in result.stderr
+    assert time.monotonic() - start < 5
+    child = int((hanging_manim / "Hang").read_text())
+    time.sleep(0.1)
+    assert not alive(child)
+
+
+def test_closing_early_drops_queued_and_kills_running_dry_runs(hanging_manim):
+    code_files = {f"{name}.py": scene(name) for name in ("Fast", "HangA", "HangB", "HangC")}
+    results = iter_validate_scenes(code_files, max_workers=2)
+
+    first = next(results)
+    while not list(hanging_manim.iterdir()):
+        time.sleep(0.05)  # a hanging dry run has started
+    start = time.monotonic()
+    results.close()
+
+    assert first.class_name == "Fast"
+    assert time.monotonic() - start < 1
+    time.sleep(CANCEL_WAIT)
+    started = {path.name: int(path.read_text()) for path in hanging_manim.iterdir()}
+    assert len(started) < 3  # at most the two workers' dry runs ever started
+    assert not any(alive(pid) for pid in started.values())
@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from agents.schemas import ManimFile, ScriptGeneration
+from scripts.plan_checker import check_plan_conformance
+from conftest import FIXTURES, manim_file, scene_description
+
+
+def script() -> ScriptGeneration:
+    return ScriptGeneration.model_validate(json.loads((FIXTURES / "script_gen.json").read_text())[0])
+
+
+def edit(target, **changes):
+    """A mutation replacing fields of one generated scene"""
+    def apply(file):
+        file["scenes"] = [dict(s, **changes) if s["scene_id"] == target else s for s in file["scenes"]]
+    return apply
+
+
+def drop_scene(scene_id):
+    def apply(file):
+        file["scenes"] = [s for s in file["scenes"] if s["scene_id"] != scene_id]
+    return apply
+
+
+def obj(object_id, var_name, constructor):
+    return {"object_id": object_id, "var_name": var_name, "constructor": constructor, "add_to_scene": False}
+
+
+TRIANGLE = obj("triangle", "triangle", "Polygon(ORIGIN, 3 * RIGHT, 3 * RIGHT + 2 * UP)")
+
+
+@pytest.mark.parametrize("mutate, expected", [
+    (None, []),
+    (edit("s1", animations=[]), [("s1", "missing_animation", "error"), ("s1", "duration_mismatch", "warning")]),
+    (edit("s2", objects=[]), [("s2", "missing_object", "error")]),
+    (edit("s2", scene_id="s9"), [("s9", "unknown_scene", "error"), ("s2", "missing_scene", "error")]),
+    (drop_scene("s2"), [("s2", "missing_scene", "error")]),
+    (edit("s1", objects=[TRIANGLE, obj("copy", "triangle", "triangle.copy()")]),
+     [("s1", "duplicate_variable", "error")]),
+    (edit("s1", objects=[obj("triangle", "2triangle", "Triangle()")]), [("s1", "invalid_variable", "error")]),
+    (edit("s1", setup_code=["triangle.set_color(RED)"]), [("s1", "undefined_variable", "error")]),
+    # Setup code may bind an object's variable itself before using it
+    (edit("s1", setup_code=["triangle = Triangle()", "triangle.set_color(RED)"]), []),
+    (edit("s1", objects=[obj("label", "label", "MathTex('c').next_to(triangle)"), TRIANGLE]),
+     [("s1", "undefined_variable", "error")]),
+    (edit("s1", objects=[TRIANGLE, obj("label", "label", "MathTex('c').next_to(triangle)")]), []),
+    # Animation calls are not checked for names
+    (edit("s1", animations=[{"animation_id": "draw_triangle", "call": "Create(square)", "run_time": 4.0}]), []),
+    (edit("s1", animations=[{"animation_id": "draw_triangle", "call": "Create(triangle)", "run_time": 20.0}]),
+     [("s1", "duration_mismatch", "warning")]),
+])
+def test_check_plan_conformance(mutate, expected):
+    file = manim_file()
+    if mutate:
+        mutate(file)
+
+    violations = check_plan_conformance(scene_description(), ManimFile.model_validate(file), script())
+
+    assert [(v.scene_id, v.kind, v.severity) for v in violations] == expected
+
+
+def test_duration_falls_back_to_action_durations_without_a_script():
+    plan = scene_description()
+    plan.scenes[0].actions[0].duration = 1.0
+
+    violations = check_plan_conformance(plan, ManimFile.model_validate(manim_file()))
+
+    assert [(v.scene_id, v.kind, v.severity) for v in violations] == [("s1", "duration_mismatch", "warning")]
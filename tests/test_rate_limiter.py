@@ -0,0 +1,121 @@
+import threading
+import time
+
+from scripts.rate_limiter import RateLimiter, job_context
+
+
+def test_block_holds_only_the_limited_model():
+    limiter = RateLimiter({"fake": {"rpm": 1000}})
+    limiter.block("fake", "small", 5)
+
+    start = time.monotonic()
+    limiter.acquire("fake", "large", 10)
+    assert time.monotonic() - start < 0.5
+
+    waited = limiter.acquire("fake", "small", 10, cancelled=lambda: time.monotonic() - start > 0.3)
+    assert 0.2 < waited < 1
+
+
+def test_provider_wide_block_holds_every_model():
+    limiter = RateLimiter({})
+    limiter.block("fake", "small", 5, provider_wide=True)
+
+    start = time.monotonic()
+    limiter.acquire("fake", "large", 10, cancelled=lambda: time.monotonic() - start > 0.3)
+    assert time.monotonic() - start > 0.2
+
+
+def test_cancelled_waiter_leaves_the_queue_without_capacity():
+    limiter = RateLimiter({"fake": {"rpm": 1}})
+    limiter.acquire("fake", "small", 10)
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+
+    waited = limiter.acquire("fake", "small", 10, cancelled=cancel.is_set)
+
+    assert waited < 1
+    with limiter._transaction() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM waiters").fetchone()[0] == 0
+
+
+def wait_in_background(limiter, provider, model, tokens, priority, cancel):
+    """Start an acquire as another job at priority; it gives up once cancel is set"""
+    def run():
+        with job_context(job_id="other", priority=priority):
+            limiter.acquire(provider, model, tokens, cancelled=cancel.is_set)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(0.2)  # let it join the queue
+    return thread
+
+
+def test_waiter_stalled_on_a_blocked_model_does_not_hold_up_other_models():
+    limiter = RateLimiter({"fake": {"rpm": 1000}})
+    limiter.block("fake", "small", 3)
+    cancel = threading.Event()
+    thread = wait_in_background(limiter, "fake", "small", 10, 5, cancel)
+
+    try:
+        waited = limiter.acquire("fake", "large", 10)
+    finally:
+        cancel.set()
+        thread.join()
+
+    assert waited < 0.5
+
+
+def test_waiter_stalled_on_its_model_tpm_does_not_hold_up_other_models():
+    limiter = RateLimiter({"fake": {"rpm": 1000}, "fake/small": {"tpm": 100}})
+    limiter.acquire("fake", "small", 100)  # drains fake/small
+    cancel = threading.Event()
+    thread = wait_in_background(limiter, "fake", "small", 100, 5, cancel)
+
+    try:
+        waited = limiter.acquire("fake", "large", 10)
+    finally:
+        cancel.set()
+        thread.join()
+
+    assert waited < 0.5
+
+
+def test_higher_priority_waiter_on_the_same_model_goes_first():
+    limiter = RateLimiter({"fake/small": {"rpm": 60}})
+    for _ in range(60):
+        limiter.acquire("fake", "small", 10)  # drained: the next request fits in ~1s
+    cancel = threading.Event()
+    thread = wait_in_background(limiter, "fake", "small", 10, 5, cancel)
+
+    start = time.monotonic()
+    waited = limiter.acquire("fake", "small", 10, cancelled=lambda: time.monotonic() - start > 1.5)
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()  # the high-priority waiter was granted
+    assert waited > 1.4  # and this one was still behind it
+
+
+def test_waiter_dropped_as_stale_rejoins_the_queue():
+    limiter = RateLimiter({"fake/small": {"rpm": 60}})
+    for _ in range(60):
+        limiter.acquire("fake", "small", 10)
+    cancel = threading.Event()
+    other = wait_in_background(limiter, "fake", "small", 10, 0, cancel)
+    results = []
+
+    def run():
+        with job_context(job_id="stale", priority=5):
+            results.append(limiter.acquire("fake", "small", 10))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    time.sleep(0.1)
+    with limiter._transaction() as conn:
+        # As if another process found this waiter silent for too long
+        conn.execute("DELETE FROM waiters WHERE job = 'stale'")
+
+    thread.join(timeout=5)
+    cancel.set()
+    other.join()
+
+    assert results and results[0] < 3
@@ -0,0 +1,172 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from service import JobService, _handler_class
+from conftest import fake_config, fake_rung
+
+
+@pytest.fixture
+def service(tmp_path, model_config, fake_manim):
+    """A started JobService on fake models, served on a free local port"""
+    model_config(fake_config())
+    job_service = JobService(str(tmp_path / "service"), workers=2)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_class(job_service))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    job_service.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield job_service
+    job_service.stop()
+    server.shutdown()
+    server.server_close()
+
+
+def request(service, method, path, body=None, headers=None):
+    """(status, body) for a request to the service; JSON bodies are decoded"""
+    data = json.dumps(body).encode() if isinstance(body, dict) else body
+    req = urllib.request.Request(service.url + path, data=data, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as response:
+            status, payload, kind = response.status, response.read(), response.headers["Content-Type"]
+    except urllib.error.HTTPError as e:
+        status, payload, kind = e.code, e.read(), e.headers["Content-Type"]
+    return status, json.loads(payload) if kind == "application/json" else payload.decode()
+
+
+def read_events(stream):
+    """Parse an SSE body into (id, event, data) tuples"""
+    events = []
+    for block in stream.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def wait_for(service, job_id, statuses, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = service.queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {job['status']}")
+
+
+def test_submit_streams_events_until_the_job_succeeds(service):
+    service.start()
+    status, body = request(service, "POST", "/jobs", {"query": "Why is the Pythagorean theorem true?"})
+    assert status == 202
+
+    status, stream = request(service, "GET", body["events"])
+    events = read_events(stream)
+
+    assert status == 200
+    assert [seq for seq, _, _ in events] == list(range(1, len(events) + 1))
+    assert events[-1][1:] == ("status", {"status": "succeeded", "time": events[-1][2]["time"]})
+    finished = [data["stage"] for _, kind, data in events if kind == "stage" and data["status"] == "finished"]
+    assert finished == ["script", "scene", "code", "write"]
+    artifacts = [data["filename"] for _, kind, data in events if kind == "artifact"]
+    job = request(service, "GET", f"/jobs/{body['job_id']}")[1]
+    assert job["status"] == "succeeded"
+    assert len(job["result"]["files"]) == len(artifacts) == 2
+
+    # Resuming replays only later events
+    _, resumed = request(service, "GET", body["events"], headers={"Last-Event-ID": str(events[-3][0])})
+    assert read_events(resumed) == events[-2:]
+
+
+def test_concurrent_jobs_on_the_same_fake_models_both_succeed(service):
+    service.start()
+    job_ids = [service.submit(f"Question {i}") for i in range(2)]
+
+    for job_id in job_ids:
+        assert wait_for(service, job_id, ("succeeded", "failed", "cancelled"))["status"] == "succeeded"
+
+
+def test_fake_models_are_not_shared_between_jobs(model_config):
+    from agents.llm import _fake_models, build_chat_model, release_fake_models
+    from scripts.rate_limiter import job_context
+
+    model_config(fake_config())
+    with job_context(job_id="a"):
+        first = build_chat_model("fake", "script", options={"responses": ["x"]})
+        assert build_chat_model("fake", "script", options={"responses": ["x"]}) is first
+    with job_context(job_id="b"):
+        assert build_chat_model("fake", "script", options={"responses": ["x"]}) is not first
+
+    release_fake_models("a")
+    assert [key[0] for key in _fake_models] == ["b"]
+
+
+@pytest.mark.parametrize("query, headers", [
+    ("?after=abc", {}),
+    ("", {"Last-Event-ID": "not-a-number"}),
+])
+def test_events_rejects_non_integer_resume_ids(service, query, headers):
+    job_id = service.submit("Why?")
+
+    status, body = request(service, "GET", f"/jobs/{job_id}/events{query}", headers=headers)
+
+    assert status == 400
+    assert "error" in body
+
+
+def test_submit_rejects_bad_bodies(service):
+    assert request(service, "POST", "/jobs", b"not json")[0] == 400
+    assert request(service, "POST", "/jobs", {"query": " "})[0] == 400
+    assert request(service, "POST", "/jobs", {"query": "Why?", "max_retries": 0})[0] == 400
+    assert request(service, "GET", "/jobs/missing")[0] == 404
+
+
+def test_cancel_queued_job(service):
+    job_id = service.submit("Why?")  # workers not started, so it stays queued
+
+    status, body = request(service, "POST", f"/jobs/{job_id}/cancel")
+
+    assert (status, body["status"]) == (200, "cancelled")
+    assert service.queue.get(job_id)["status"] == "cancelled"
+
+
+def test_cancel_running_job(service, model_config):
+    model_config(fake_config(stages={**fake_config()["stages"], "script_gen": [
+        fake_rung("script", "script_gen", latency={"distribution": "fixed", "seconds": 0.5})
+    ]}))
+    service.start()
+    job_id = service.submit("Why?")
+    wait_for(service, job_id, ("running",))
+
+    status, body = request(service, "DELETE", f"/jobs/{job_id}")
+
+    assert (status, body["status"]) == (202, "running")
+    assert wait_for(service, job_id, ("succeeded", "failed", "cancelled"))["status"] == "cancelled"
+    stages = [e["data"] for e in service.queue.events(job_id, 0) if e["kind"] == "stage"]
+    assert stages[-1]["status"] == "cancelled"
+    assert not any(s["stage"] == "write" for s in stages)
+
+
+def test_cancel_between_claim_and_run_is_not_lost(service):
+    job_id = service.submit("Why?")
+    job = service.queue.claim()
+    service.cancel(job_id)  # not yet registered as running
+
+    service._run(job)
+
+    assert service.queue.get(job_id)["status"] == "cancelled"
+
+
+def test_health_and_metrics(service):
+    service.submit("Why?")
+
+    status, health = request(service, "GET", "/health")
+    assert status == 200
+    assert health["status"] == "ok"
+    assert health["jobs"]["queued"] == 1
+
+    status, metrics = request(service, "GET", "/metrics")
+    assert status == 200
+    assert 'theorem_service_jobs{status="queued"} 1' in metrics
@@ -1,7 +1,6 @@
-from langchain.tools import Tool # pyright: ignore[reportMissingImports]
-import requests
 import os
 import json
+from scripts.cassette import recordable_tool
 
 def manim_doc_reference(query: str) -> str:
     context7_api_key = os.getenv("CONTEXT7_API_KEY")
@@ -20,6 +19,8 @@ def manim_doc_reference(query: str) -> str:
         "type": "json"
     }
 
+    import requests
+
     try:
         response = requests.get(url, headers=headers, params=params, timeout=10)
         response.raise_for_status()
@@ -45,8 +46,21 @@ def manim_doc_reference(query: str) -> str:
         return "No Manim documentation found for this query"
     return json.dumps(result, indent=2)
 
-manim_tool = Tool(
-    name="manim_doc_reference",
-    func=manim_doc_reference,
-    description="REQUIRED: Validate Manim class/animation exists before using. Query EVERY constructor and animation call to ensure it's a real Manim API. Returns documentation if exists, error if not."
-)
+def _build_manim_tool():
+    from langchain.tools import Tool # pyright: ignore[reportMissingImports]
+    return Tool(
+        name="manim_doc_reference",
+        func=recordable_tool("manim_doc_reference", manim_doc_reference),
+        description="REQUIRED: Validate Manim class/animation exists before using. Query EVERY constructor and animation call to ensure it's a real Manim API. Returns documentation if exists, error if not."
+    )
+
+_manim_tool = None
+
+def __getattr__(name: str):
+    # manim_tool is built on first access so importing this module doesn't pull in LangChain
+    global _manim_tool
+    if name == "manim_tool":
+        if _manim_tool is None:
+            _manim_tool = _build_manim_tool()
+        return _manim_tool
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")